@@ -0,0 +1,120 @@
+"""In-process cache of RetrievalQA answers for /query.
+
+Entries are keyed by the normalized question. Optionally a question whose
+embedding has cosine similarity >= similarity_threshold with a cached one
+is answered from that entry too. Entries expire after ttl seconds, the
+least recently used ones are evicted beyond max_size, and the whole cache
+is dropped when version_fn (the number of index reloads) changes.
+ANSWER_CACHE_SIZE=0 disables the cache.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from embedding_cache import normalize_text
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+# e.g. 0.95 to also serve near-duplicate questions; unset = exact matches only
+ANSWER_CACHE_SIMILARITY = float(os.environ["ANSWER_CACHE_SIMILARITY"]) if os.environ.get("ANSWER_CACHE_SIMILARITY") else None
+VERSION_CHECK_INTERVAL = 1.0  # seconds between index version checks
+
+
+class AnswerCache:
+    def __init__(self, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY, version_fn=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.version_fn = version_fn
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (slot, expires_at, response)
+        self._vectors = None           # unit query embeddings, one row per slot
+        self._slot_keys = [None] * max_size
+        self._version = version_fn() if version_fn else None
+        self._version_checked = time.monotonic()
+
+    def _check_version(self, now):
+        if self.version_fn is None or now - self._version_checked < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked = now
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._slot_keys = [None] * self.max_size
+            self.invalidations += 1
+
+    def _nearest(self, query_vector):
+        if self._vectors is None or not self._entries:
+            return None
+        scores = self._vectors @ _unit(query_vector)
+        scores[[not key for key in self._slot_keys]] = -1.0
+        slot = int(np.argmax(scores))
+        return self._slot_keys[slot] if scores[slot] >= self.similarity_threshold else None
+
+    def _drop(self, key):
+        slot, _, _ = self._entries.pop(key)
+        self._slot_keys[slot] = None
+
+    def get(self, query, query_vector=None):
+        """Return the cached response for query (or a near-duplicate of it), else None."""
+        key = normalize_text(query)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(now)
+            semantic = False
+            if key not in self._entries and self.similarity_threshold is not None and query_vector is not None:
+                key = self._nearest(query_vector)
+                semantic = key is not None
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < now:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.semantic_hits += semantic
+            return entry[2]
+
+    def put(self, query, response, query_vector=None):
+        if self.max_size < 1:
+            return
+        key = normalize_text(query)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(now)
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.max_size:
+                self._drop(next(iter(self._entries)))
+            slot = self._slot_keys.index(None)
+            if query_vector is not None:
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_size, len(query_vector)), dtype=np.float32)
+                self._vectors[slot] = _unit(query_vector)
+                self._slot_keys[slot] = key
+            else:
+                # Exact-match only entry: keep the slot reserved but never match it semantically
+                self._slot_keys[slot] = ""
+            self._entries[key] = (slot, now + self.ttl, response)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits,
+                    "semantic_hits": self.semantic_hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0, "invalidations": self.invalidations}
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,191 @@
+"""ASGI entry point with async POST /query, POST /query_stream and POST /patient.
+
+    uvicorn asgi:app --workers 2
+
+Each worker is a separate process running create_app(), so SECRET_KEY
+must be set for them to accept each other's session cookies.
+
+The sync views hold a worker thread for the whole Groq round trip. Here the
+LLM routes await the chain's ainvoke/apredict, or iterate llm.astream for
+/query_stream, so one worker process multiplexes hundreds of in-flight LLM
+calls. Their session and database steps (begin_query/finish_query,
+begin_query_stream/AnswerStream and begin_patient/finish_patient in app.py)
+run inside a Flask request context on ASYNC_CPU_THREADS threads. The same executor is the event loop's default, so it also
+receives the retriever's CPU work (embedding, FAISS search, compression),
+which langchain's ainvoke hands to run_in_executor. Every other route is
+the Flask app itself, served from ASYNC_WSGI_THREADS threads by a2wsgi.
+
+sample/load_test.py compares the concurrent users one worker sustains here
+and under gunicorn.
+"""
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+import app as flask_module
+
+ASYNC_CPU_THREADS = int(os.environ.get("ASYNC_CPU_THREADS", "8"))
+ASYNC_WSGI_THREADS = int(os.environ.get("ASYNC_WSGI_THREADS", "16"))
+
+logger = logging.getLogger(__name__)
+flask_app = flask_module.app
+wsgi_app = WSGIMiddleware(flask_app, workers=ASYNC_WSGI_THREADS)
+cpu_executor = ThreadPoolExecutor(ASYNC_CPU_THREADS, thread_name_prefix="async-cpu")
+
+
+def in_request(environ, step, *args):
+    """Run step(*args) in a Flask request context; return (response, None) or (None, state).
+
+    Steps return a dict of state to continue with, or anything Flask accepts
+    as a response, which is finalized here (error handlers, session cookie).
+    """
+    with flask_app.request_context(environ):
+        try:
+            result = step(*args)
+            if isinstance(result, dict):
+                return None, result
+        except Exception as e:
+            try:
+                result = flask_app.handle_user_exception(e)
+            except Exception as unhandled:
+                result = flask_app.handle_exception(unhandled)
+        return flask_app.finalize_request(result), None
+
+def reraise(e):
+    raise e
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return bytes(body)
+
+async def send_start(send, response):
+    headers = [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+
+async def send_response(send, response):
+    await send_start(send, response)
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def run_llm_route(scope, receive, send, begin, call_llm, finish):
+    """begin (executor) -> await call_llm(state) -> finish (executor); errors go through Flask's handlers."""
+    loop = asyncio.get_running_loop()
+    body = await read_body(receive)
+    environ = lambda: build_environ(scope, io.BytesIO(body))  # a fresh body stream per step
+    response, state = await loop.run_in_executor(cpu_executor, in_request, environ(), begin)
+    if response is None:
+        try:
+            result = await call_llm(state)
+        except Exception as e:
+            logger.exception("async %s failed", scope["path"])
+            response, _ = await loop.run_in_executor(cpu_executor, in_request, environ(), reraise, e)
+        else:
+            response, _ = await loop.run_in_executor(cpu_executor, in_request, environ(), finish, state, result)
+    await send_response(send, response)
+
+
+async def query(scope, receive, send):
+    async def call_llm(state):
+        if state['response'] is not None:  # answer cache hit
+            return state['response']
+        qa_chain = await asyncio.get_running_loop().run_in_executor(
+            cpu_executor, flask_module.resources.get, 'qa_chain')
+        return await flask_module.single_flight.ado(
+            state['query'], lambda: qa_chain.ainvoke({'query': state['query'], 'context': state['context']}))
+    await run_llm_route(scope, receive, send, flask_module.begin_query, call_llm, flask_module.finish_query)
+
+async def generate_answer(state):
+    docs = await state['qa_chain'].retriever.ainvoke(state['query'])
+    yield docs
+    async for chunk in state['llm'].astream(flask_module.stream_prompt(state, docs)):
+        yield chunk.content
+
+async def answer_chunks(state):
+    """app.answer_chunks, with the retriever and Groq awaited."""
+    if state['response'] is not None:  # small talk and cached answers are streamed whole
+        yield state['response']['source_documents']
+        yield state['response']['result']
+        return
+    async for item in flask_module.single_flight.astream(state['query'], lambda: generate_answer(state)):
+        yield item
+
+def close_answer(answer):
+    with flask_app.app_context():
+        answer.close()
+
+async def query_stream(scope, receive, send):
+    """The events of app.query_stream; the Groq stream is cancelled if the client goes away."""
+    loop = asyncio.get_running_loop()
+    body = await read_body(receive)
+    environ = lambda: build_environ(scope, io.BytesIO(body))
+    response, state = await loop.run_in_executor(cpu_executor, in_request, environ(), flask_module.begin_query_stream)
+    if response is not None:
+        return await send_response(send, response)
+    # The session cookie is finalized with the headers, before the first event
+    response, _ = await loop.run_in_executor(cpu_executor, in_request, environ(), flask_module.start_query_stream, state)
+    await send_start(send, response)
+
+    answer = flask_module.AnswerStream(state)
+    async def events():
+        chunks = answer_chunks(state)
+        try:
+            async for item in chunks:
+                for event in answer.feed(item):
+                    await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+            last = answer.done()
+        except Exception as e:
+            last = [answer.error(e)]
+        finally:
+            await chunks.aclose()
+        await send({"type": "http.response.body", "body": "".join(last).encode(), "more_body": True})
+
+    streaming = asyncio.ensure_future(events())
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await asyncio.wait({streaming, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnected.cancel()
+        streaming.cancel()  # closes the Groq stream when the client left first
+        await asyncio.gather(streaming, return_exceptions=True)
+        await loop.run_in_executor(cpu_executor, close_answer, answer)
+    await send({"type": "http.response.body", "body": b""})
+
+async def patient(scope, receive, send):
+    async def call_llm(state):
+        try:
+            return await state['chain'].apredict(human_input=state['user_input'])
+        except Exception as e:
+            return f"An error occurred: {e}"
+    await run_llm_route(scope, receive, send, flask_module.begin_patient, call_llm, flask_module.finish_patient)
+
+ASYNC_ROUTES = {"/query": query, "/query_stream": query_stream, "/patient": patient}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                asyncio.get_running_loop().set_default_executor(cpu_executor)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # Write the chat messages and histories still queued before the worker goes away
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(cpu_executor, flask_module.message_writer.close)
+                await loop.run_in_executor(cpu_executor, flask_module.history_writer.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in ASYNC_ROUTES:
+        return await ASYNC_ROUTES[scope["path"]](scope, receive, send)
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,147 @@
+"""On-disk BM25 inverted index over the docstore chunks, and a hybrid retriever.
+
+Built by sample/create_memory_for_llm.py from the saved docstore, so a
+posting's document number is the docstore row (= FAISS position). Files
+under <db_path>/bm25/::
+
+    meta.json     {"rows", "k1", "b", "avgdl"}
+    vocab.json    sorted list of terms; term id = list position
+    offsets.npy   int64[terms + 1] start of each term's postings
+    docs.npy      int32[postings] docstore rows, ascending within a term
+    weights.npy   float32[postings] precomputed idf * saturated tf of the term in that row
+
+Query-time BM25 is then a sum of the query terms' posting weights.
+HybridRetriever merges those lexical candidates with the dense FAISS
+candidates by reciprocal rank fusion, so exact drug and disease names
+that MiniLM misses still reach the prompt.
+"""
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import Any, List
+import numpy as np
+from langchain_core.retrievers import BaseRetriever
+from mmap_docstore import aside, replace_aside
+from store_versions import store_path
+
+BM25_DIR = "bm25"
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = frozenset("""a an and are as at be by can do does for from has have how i in is it its me my
+of on or that the this to was were what when which who why will with you your""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def build_bm25_index(path, texts, k1=1.5, b=0.75):
+    """Write the inverted index of texts (in docstore row order) under path."""
+    postings = {}
+    doc_lens = []
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        doc_lens.append(sum(counts.values()))
+        for term, tf in counts.items():
+            rows, tfs = postings.setdefault(term, ([], []))
+            rows.append(row)
+            tfs.append(tf)
+
+    rows_total = len(doc_lens)
+    doc_lens = np.array(doc_lens, dtype=np.float32)
+    avgdl = float(doc_lens.mean()) if rows_total else 0.0
+    vocab = sorted(postings)
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    docs, weights = [], []
+    for term_id, term in enumerate(vocab):
+        rows, tfs = postings.pop(term)
+        rows = np.array(rows, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+        idf = math.log(1 + (rows_total - len(rows) + 0.5) / (len(rows) + 0.5))
+        norm = k1 * (1 - b + b * doc_lens[rows] / avgdl)
+        docs.append(rows)
+        weights.append((idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+        offsets[term_id + 1] = offsets[term_id] + len(rows)
+
+    # Written aside and renamed, meta.json last: running workers have the arrays memory-mapped
+    os.makedirs(path, exist_ok=True)
+    files = [os.path.join(path, name) for name in ("offsets.npy", "docs.npy", "weights.npy", "vocab.json", "meta.json")]
+    arrays = [offsets, np.concatenate(docs) if docs else np.zeros(0, dtype=np.int32),
+              np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)]
+    for file, array in zip(files, arrays):
+        with open(aside(file), "wb") as f:
+            np.save(f, array)
+    with open(aside(files[3]), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(aside(files[4]), "w", encoding="utf-8") as f:
+        json.dump({"rows": rows_total, "k1": k1, "b": b, "avgdl": avgdl}, f)
+    replace_aside(files)
+
+
+class BM25Index:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            self.term_ids = {term: term_id for term_id, term in enumerate(json.load(f))}
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r", allow_pickle=False)
+        self.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode="r", allow_pickle=False)
+        self.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r", allow_pickle=False)
+
+    def search(self, query, k):
+        """Return up to k (row, score) pairs, best first."""
+        docs, weights = [], []
+        for term, count in Counter(tokenize(query)).items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs.append(self.docs[start:end])
+            weights.append(self.weights[start:end] * count)
+        if not docs:
+            return []
+        rows, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+
+def load_bm25_index(db_path):
+    """Return the BM25 index of the store's published build, or None for stores built without one."""
+    path = os.path.join(store_path(db_path), BM25_DIR)
+    return BM25Index(path) if os.path.exists(os.path.join(path, "meta.json")) else None
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """Merge ranked lists of rows: score = sum of 1 / (rrf_k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS + BM25 retriever over a read-only store from load_vectorstore."""
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 3
+    fetch_k: int = 20  # candidates taken from each ranking before fusion
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Any]:
+        query_vector = np.asarray([self.vectorstore.embedding_function.embed_query(query)], dtype=np.float32)
+        _, dense = self.vectorstore.index.search(query_vector, self.fetch_k)
+        return self.fuse(query, dense[0])
+
+    def fuse(self, query, dense_positions):
+        """Fuse FAISS result positions for query with its BM25 ranking; return the top k documents."""
+        dense_rows = [self.vectorstore.index_to_docstore_id[int(i)] for i in dense_positions if i != -1]
+        # Postings from another build can point past the end of this docstore; skip those rows
+        rows_total = len(self.vectorstore.docstore)
+        lexical_rows = [row for row, _ in self.bm25.search(query, self.fetch_k) if row < rows_total]
+        rows = reciprocal_rank_fusion([dense_rows, lexical_rows], self.k, self.rrf_k)
+        return [self.vectorstore.docstore.search(row) for row in rows]
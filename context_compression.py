@@ -0,0 +1,78 @@
+"""Sentence-level compression of retrieved chunks before they are stuffed into the prompt.
+
+EmbeddingSentenceCompressor is a langchain document compressor, so it
+plugs in between the retriever and the "stuff" chain through
+ContextualCompressionRetriever. Every sentence of the retrieved chunks is
+scored by cosine similarity with the query embedding in one matrix
+product; only sentences scoring at least min_similarity (and at most
+max_sentences of them) are kept, in their original order. Query vectors
+come from the query LRU and sentence vectors from the on-disk embedding
+cache, so repeated chunks cost no extra forward passes.
+"""
+import os
+import re
+import logging
+import threading
+from typing import Any, Optional, Sequence
+import numpy as np
+from pydantic import PrivateAttr
+from langchain_core.documents import Document, BaseDocumentCompressor
+from token_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+COMPRESSION_MIN_SIMILARITY = float(os.environ.get("COMPRESSION_MIN_SIMILARITY", "0.25"))
+COMPRESSION_MAX_SENTENCES = int(os.environ.get("COMPRESSION_MAX_SENTENCES", "12"))
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_RE.split(text) if sentence.strip()]
+
+
+class EmbeddingSentenceCompressor(BaseDocumentCompressor):
+    embeddings: Any
+    min_similarity: float = COMPRESSION_MIN_SIMILARITY
+    max_sentences: int = COMPRESSION_MAX_SENTENCES
+    min_sentences: int = 1  # always keep the best sentence(s) so the context is never empty
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"requests": 0, "tokens_in": 0, "tokens_out": 0})
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Any] = None):
+        sentences = [(i, sentence) for i, doc in enumerate(documents) for sentence in split_sentences(doc.page_content)]
+        if not sentences:
+            return list(documents)
+
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        sentence_vectors = np.asarray(self.embeddings.embed_documents([sentence for _, sentence in sentences]),
+                                      dtype=np.float32)
+        norms = np.linalg.norm(sentence_vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        scores = sentence_vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+
+        ranked = np.argsort(-scores)
+        keep = [int(i) for i in ranked[:self.max_sentences] if scores[i] >= self.min_similarity]
+        if len(keep) < self.min_sentences:
+            keep = [int(i) for i in ranked[:self.min_sentences]]
+        keep = set(keep)
+
+        compressed = []
+        for i, doc in enumerate(documents):
+            kept = [sentence for j, (doc_index, sentence) in enumerate(sentences) if doc_index == i and j in keep]
+            if kept:
+                compressed.append(Document(id=doc.id, page_content=" ".join(kept), metadata=doc.metadata))
+
+        tokens_in = sum(count_tokens(doc.page_content) for doc in documents)
+        tokens_out = sum(count_tokens(doc.page_content) for doc in compressed)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["tokens_in"] += tokens_in
+            self._stats["tokens_out"] += tokens_out
+        logger.info("context compression: %d -> %d tokens (%d saved), %d/%d sentences kept",
+                    tokens_in, tokens_out, tokens_in - tokens_out, len(keep), len(sentences))
+        return compressed
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["tokens_saved"] = stats["tokens_in"] - stats["tokens_out"]
+        return stats
@@ -0,0 +1,161 @@
+"""Server-side chat histories, keyed by a small session ID kept in the cookie.
+
+Flask's session is a signed cookie, so histories kept in it were
+re-serialized on every response and outgrew the browser's ~4 KB cookie
+limit. Here each (session ID, mode) pair, mode being "chat" or
+"patient", has its own list of {"role", "content"} messages.
+
+Reads go through an in-process LRU of CONVERSATION_CACHE_SIZE histories.
+Writes go to the LRU at once and to the durable backend through a
+write-behind queue (write_behind.py), so a turn does not wait for a
+commit. The cookie carries a revision number per mode that every write
+increments, and the backend stores it with the history. A cached history
+whose revision differs from the request's is reloaded from the backend.
+If the backend is behind, another worker's write is still queued: the
+load is retried for up to HISTORY_WAIT_SECONDS, one writer interval or so.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import insert, select, update
+
+CONVERSATION_CACHE_SIZE = int(os.environ.get("CONVERSATION_CACHE_SIZE", "1024"))
+HISTORY_WAIT_SECONDS = float(os.environ.get("HISTORY_WAIT_SECONDS", "1"))
+HISTORY_POLL_SECONDS = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+class SqlConversationBackend:
+    """Stores each history as one row of model (columns sid, mode, messages, updated_at).
+
+    messages holds {"rev": n, "messages": [...]} as JSON. Every load uses its own connection,
+    so a retried load sees rows committed since, whatever the request's transaction has read.
+    """
+
+    def __init__(self, db, model):
+        self.db = db
+        self.table = model.__table__
+
+    def _stored(self, conn, sid, mode):
+        value = conn.execute(select(self.table.c.messages).where(
+            self.table.c.sid == sid, self.table.c.mode == mode)).scalar()
+        if value is None:
+            return 0, []
+        data = json.loads(value)
+        # Rows written before revisions were stored are a bare list; they match any revision
+        return (None, data) if isinstance(data, list) else (data["rev"], data["messages"])
+
+    def load(self, sid, mode):
+        """(revision, messages) of the stored history; revision None if unknown."""
+        with self.db.engine.connect() as conn:
+            return self._stored(conn, sid, mode)
+
+    def save_many(self, rows):
+        """Store {"sid", "mode", "rev", "messages"} rows; only the newest revision of each history counts."""
+        newest = {}
+        for row in rows:
+            key = (row["sid"], row["mode"])
+            if key not in newest or row["rev"] > newest[key]["rev"]:
+                newest[key] = row
+        with self.db.engine.begin() as conn:
+            for (sid, mode), row in newest.items():
+                rev, _ = self._stored(conn, sid, mode)
+                values = {"messages": json.dumps({"rev": row["rev"], "messages": row["messages"]}),
+                          "updated_at": datetime.utcnow()}
+                exists = conn.execute(select(self.table.c.sid).where(
+                    self.table.c.sid == sid, self.table.c.mode == mode)).first() is not None
+                if not exists:
+                    conn.execute(insert(self.table).values(sid=sid, mode=mode, **values))
+                elif rev is None or rev < row["rev"]:
+                    conn.execute(update(self.table).where(
+                        self.table.c.sid == sid, self.table.c.mode == mode).values(**values))
+
+
+class ConversationStore:
+    def __init__(self, backend, writer=None, max_size=CONVERSATION_CACHE_SIZE, wait_seconds=HISTORY_WAIT_SECONDS):
+        self.backend = backend
+        self.writer = writer  # a WriteBehindQueue flushing to backend.save_many; None writes synchronously
+        self.max_size = max_size
+        self.wait_seconds = wait_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.lagging = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (sid, mode) -> (rev, messages)
+
+    def _cached(self, key, rev):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == rev:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            self.stale += entry is not None
+        return None
+
+    def _put(self, key, rev, messages):
+        with self._lock:
+            self._entries[key] = (rev, messages)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, sid, mode, rev):
+        if self.writer is not None:
+            self.writer.wait_for(f"{sid}:{mode}")  # this process's own queued write
+        deadline = time.monotonic() + self.wait_seconds
+        stored_rev, messages = self.backend.load(sid, mode)
+        while stored_rev is not None and stored_rev < rev and time.monotonic() < deadline:
+            # Written by another worker whose queue has not been flushed yet
+            time.sleep(HISTORY_POLL_SECONDS)
+            stored_rev, messages = self.backend.load(sid, mode)
+        if stored_rev is not None and stored_rev < rev:
+            logger.warning("history %s/%s is at revision %d, expected %d", sid, mode, stored_rev, rev)
+            with self._lock:
+                self.lagging += 1
+        return messages
+
+    def _save(self, sid, mode, rev, messages):
+        row = {"sid": sid, "mode": mode, "rev": rev, "messages": list(messages)}
+        if self.writer is None:
+            self.backend.save_many([row])
+        else:
+            self.writer.put([row], keys=(f"{sid}:{mode}",))
+        with self._lock:
+            self.writes += 1
+
+    def get(self, sid, mode, rev):
+        """The history of sid in mode, as of revision rev (the one in the request's cookie)."""
+        key = (sid, mode)
+        messages = self._cached(key, rev)
+        if messages is None:
+            messages = tuple(self._load(sid, mode, rev))
+            self._put(key, rev, messages)
+        return list(messages)
+
+    def append(self, sid, mode, messages, rev):
+        """Add messages to the history at revision rev and store it as revision rev + 1."""
+        history = tuple(self.get(sid, mode, rev)) + tuple(messages)
+        self._put((sid, mode), rev + 1, history)
+        self._save(sid, mode, rev + 1, history)
+        return list(history)
+
+    def clear(self, sid, mode, rev):
+        """Empty the history; it becomes revision rev + 1."""
+        self._put((sid, mode), rev + 1, ())
+        self._save(sid, mode, rev + 1, ())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits,
+                    "misses": self.misses, "stale": self.stale, "lagging": self.lagging, "writes": self.writes,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
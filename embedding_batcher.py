@@ -0,0 +1,85 @@
+"""Cross-request micro-batching of query embeddings.
+
+Under load every request thread would otherwise run its own one-sentence
+MiniLM forward pass. MicroBatchingEmbeddings queues embed_query calls, and
+a dispatcher thread collects whatever arrives within max_wait_ms (up to
+max_batch_size texts), embeds them with one embed_documents call and hands
+each caller its vector.
+"""
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from process_thread import ProcessThread
+
+EMBEDDING_BATCH_MAX_SIZE = int(os.environ.get("EMBEDDING_BATCH_MAX_SIZE", "16"))
+EMBEDDING_BATCH_WAIT_MS = float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", "3"))
+DELAY_SAMPLES = 1000  # recent queueing delays kept for percentiles
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    def __init__(self, embeddings, max_batch_size=EMBEDDING_BATCH_MAX_SIZE, max_wait_ms=EMBEDDING_BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._dispatcher = ProcessThread(self._dispatch, "embedding-batcher", on_start=self._reset)
+        self._batches = 0
+        self._requests = 0
+        self._delays = deque(maxlen=DELAY_SAMPLES)
+
+    def _reset(self):
+        self._queue = queue.Queue()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        self._dispatcher.ensure()
+        future = Future()
+        self._queue.put((text, time.perf_counter(), future))
+        return future.result()
+
+    def _collect(self, pending):
+        batch = [pending.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        pending = self._queue
+        while True:
+            batch = self._collect(pending)
+            started = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            with self._lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._delays.extend((started - enqueued) * 1000 for _, enqueued, _ in batch)
+
+    def stats(self):
+        with self._lock:
+            delays = np.array(self._delays) if self._delays else np.zeros(1)
+            mean_batch = self._requests / self._batches if self._batches else 0.0
+            return {"batches": self._batches, "requests": self._requests, "mean_batch_size": mean_batch,
+                    "fill_rate": mean_batch / self.max_batch_size, "max_batch_size": self.max_batch_size,
+                    "max_wait_ms": self.max_wait * 1000,
+                    "queue_delay_ms": {"mean": float(delays.mean()), "p50": float(np.percentile(delays, 50)),
+                                       "p99": float(np.percentile(delays, 99))}}
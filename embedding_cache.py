@@ -0,0 +1,247 @@
+"""Content-addressed, memory-mapped cache of sentence embeddings.
+
+Shared by sample/create_memory_for_llm.py (chunk embeddings) and app.py
+(query embeddings), so text that has been embedded once is never sent
+through the transformer again, across runs and across worker processes.
+
+On-disk layout, one directory per embedding model::
+
+    meta.json     {"model_name", "dim", "capacity", "ways"}
+    header.bin    int64[1]: access clock
+    keys.bin      uint8[capacity, 16]: truncated sha256 of model name + normalized text
+    last_used.bin int64[capacity]: access clock of each slot (0 = empty)
+    vectors.bin   float32[capacity, dim]
+
+The slots form buckets of BUCKET_WAYS; a key can only live in the bucket
+its hash names. Lookups read that bucket's keys straight from keys.bin,
+so every process sees what any other has written, and a full bucket
+replaces its least recently used slot.
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+EMBEDDING_CACHE_PATH = "vectorstore/embedding_cache"
+DEFAULT_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MB", "256")) * 1024 * 1024
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")  # "torch" or "onnx"
+BUCKET_WAYS = 8
+KEY_BYTES = 16
+
+
+def normalize_text(text):
+    # MiniLM is uncased, so case and whitespace differences embed identically
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class EmbeddingCache:
+    """Fixed-size LRU store of embedding vectors backed by numpy memmaps."""
+
+    def __init__(self, model_name, path=EMBEDDING_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.model_name = model_name
+        self.path = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None
+        os.makedirs(self.path, exist_ok=True)
+        self._open_existing()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Caches written before the bucketed layout are rebuilt
+        return meta if meta.get("model_name") == self.model_name and meta.get("ways") == BUCKET_WAYS else None
+
+    def _open(self, dim, capacity, create):
+        mode = "w+" if create else "r+"
+        self.dim = dim
+        self.capacity = capacity
+        self._header = np.memmap(self._file("header.bin"), dtype=np.int64, mode=mode, shape=(1,))
+        self._keys = np.memmap(self._file("keys.bin"), dtype=np.uint8, mode=mode, shape=(capacity, KEY_BYTES))
+        self._last_used = np.memmap(self._file("last_used.bin"), dtype=np.int64, mode=mode, shape=(capacity,))
+        self._vectors = np.memmap(self._file("vectors.bin"), dtype=np.float32, mode=mode, shape=(capacity, dim))
+        if create:
+            with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"model_name": self.model_name, "dim": dim, "capacity": capacity, "ways": BUCKET_WAYS}, f)
+
+    def _open_existing(self):
+        meta = self._read_meta()
+        if meta is not None:
+            self._open(meta["dim"], meta["capacity"], create=False)
+        return meta is not None
+
+    def _bucket(self, key):
+        """First slot of the bucket key belongs to."""
+        return int.from_bytes(key[:8], "little") % (self.capacity // BUCKET_WAYS) * BUCKET_WAYS
+
+    def _find(self, key, start):
+        bucket = self._keys[start:start + BUCKET_WAYS]
+        matches = np.flatnonzero((bucket == np.frombuffer(key, dtype=np.uint8)).all(axis=1))
+        return start + int(matches[0]) if len(matches) else None
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(self._file("lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _tick(self):
+        self._header[0] += 1
+        return self._header[0]
+
+    def get(self, key):
+        """Return a copy of the cached vector for key, or None."""
+        # Another process may have created the cache since this one started
+        if self._vectors is None and not self._open_existing():
+            self.misses += 1
+            return None
+        slot = self._find(key, self._bucket(key))
+        if slot is None:
+            self.misses += 1
+            return None
+        vector = np.array(self._vectors[slot])
+        # Checked after the copy: another process may have replaced the slot meanwhile
+        if self._keys[slot].tobytes() != key:
+            self.misses += 1
+            return None
+        self._last_used[slot] = self._tick()
+        self.hits += 1
+        return vector
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._locked():
+            if self._vectors is None and not self._open_existing():
+                dim = int(vectors.shape[1])
+                buckets = max(1, self.max_bytes // ((dim * 4 + KEY_BYTES + 8) * BUCKET_WAYS))
+                self._open(dim, buckets * BUCKET_WAYS, create=True)
+            for key, vector in zip(keys, vectors):
+                start = self._bucket(key)
+                slot = self._find(key, start)
+                if slot is None:
+                    # An empty slot (last_used 0) if there is one, else the bucket's least recently used
+                    slot = start + int(np.argmin(self._last_used[start:start + BUCKET_WAYS]))
+                # Invalidate the key first so concurrent readers never pair it with a half-written vector
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._last_used[slot] = self._tick()
+
+    def flush(self):
+        if self._vectors is not None:
+            for array in (self._header, self._keys, self._last_used, self._vectors):
+                array.flush()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model for text missing from the cache."""
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _key(self, text):
+        return cache_key(self.cache.model_name, text)
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many([key], [vector])
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+
+class QueryEmbeddingLRU(Embeddings):
+    """Bounded, thread-safe in-process LRU of query embeddings keyed by normalized text.
+
+    Sits in front of the retriever's embedding model so repeat questions skip
+    both the transformer and the memory-mapped cache lookup.
+    """
+
+    def __init__(self, embeddings, max_size=QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_text(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(vector)
+            self.misses += 1
+        # Computed outside the lock so concurrent misses do not serialize on the model
+        vector = tuple(self.embeddings.embed_query(text))
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return list(vector)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def load_embedding_backend(model_name, backend=EMBEDDING_BACKEND):
+    """Return (embeddings, cache namespace) for the configured backend."""
+    if backend == "onnx":
+        # Optional: needs onnxruntime and a model exported with `python onnx_embeddings.py export`
+        from onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(), f"{model_name}+onnx-int8"
+    # Imported here: langchain_huggingface pulls in torch, which app.py loads in the background
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name), model_name
+
+
+def get_cached_embedding_model(model_name, path=EMBEDDING_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES,
+                               backend=EMBEDDING_BACKEND):
+    embeddings, cache_name = load_embedding_backend(model_name, backend)
+    return CachedEmbeddings(embeddings, EmbeddingCache(cache_name, path, max_bytes))
@@ -0,0 +1,113 @@
+"""Approximate FAISS index types for the vector store.
+
+index.faiss is always the exact flat index: the ingestion script edits it
+incrementally and the benchmark uses it as ground truth. When ingestion is
+run with --index-type hnsw or ivfpq, an approximate copy is also written
+to search_index.faiss, with its type and parameters in search_index.json,
+and that is what app.py searches.
+"""
+import os
+import json
+import math
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+INDEX_FILE = "index.faiss"
+SEARCH_INDEX_FILE = "search_index.faiss"
+SEARCH_INDEX_CONFIG = "search_index.json"
+
+DEFAULT_PARAMS = {
+    "hnsw": {"m": 32, "ef_construction": 200, "ef_search": 64},
+    "ivfpq": {"nlist": 1024, "pq_m": 48, "pq_nbits": 8, "nprobe": 16},
+}
+MIN_POINTS_PER_CENTROID = 39  # below this faiss k-means training is unreliable
+MAX_TRAINING_POINTS = 200_000
+
+
+def index_params(index_type, base=None, **overrides):
+    """Parameters for index_type (base, else the defaults), updated with the non-None overrides."""
+    params = dict(base if base is not None else DEFAULT_PARAMS.get(index_type, {}))
+    params.update({key: value for key, value in overrides.items() if key in params and value is not None})
+    return params
+
+
+def build_index(vectors, index_type, params):
+    """Build an index of index_type over vectors (float32, shape [n, d])."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    elif index_type == "ivfpq":
+        # Small corpora cannot train the requested number of centroids/codes
+        nlist = max(1, min(params["nlist"], n // MIN_POINTS_PER_CENTROID))
+        pq_nbits = max(1, min(params["pq_nbits"], int(math.log2(max(n, 2)))))
+        pq_m = max(m for m in range(1, params["pq_m"] + 1) if dim % m == 0)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, pq_nbits)
+        if n > MAX_TRAINING_POINTS:
+            sample = np.random.default_rng(0).choice(n, MAX_TRAINING_POINTS, replace=False)
+            index.train(vectors[sample])
+        else:
+            index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    index.add(vectors)
+    set_search_params(index, index_type, params)
+    return index
+
+
+def set_search_params(index, index_type, params):
+    if index_type == "hnsw":
+        index.hnsw.efSearch = params["ef_search"]
+    elif index_type == "ivfpq":
+        index.nprobe = params["nprobe"]
+
+
+def index_vectors(flat_index):
+    return flat_index.reconstruct_n(0, flat_index.ntotal)
+
+
+def index_memory(index):
+    """Bytes taken by the index, measured as its serialized size."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def save_search_index(flat_index, db_path, index_type, params):
+    """Write the approximate search index next to index.faiss (or remove it for flat)."""
+    index_file = os.path.join(db_path, SEARCH_INDEX_FILE)
+    config_file = os.path.join(db_path, SEARCH_INDEX_CONFIG)
+    if index_type == "flat":
+        for path in (index_file, config_file):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+    index = build_index(index_vectors(flat_index), index_type, params)
+    # Written aside and renamed: running workers may have the old file memory-mapped
+    faiss.write_index(index, index_file + ".tmp")
+    os.replace(index_file + ".tmp", index_file)
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump({"index_type": index_type, "params": params}, f)
+
+
+def search_index_config(db_path):
+    """{"index_type", "params"} of the approximate index written by save_search_index, or None."""
+    config_file = os.path.join(db_path, SEARCH_INDEX_CONFIG)
+    if not os.path.exists(config_file):
+        return None
+    with open(config_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_search_index(db_path):
+    """Return the index app.py should search: the approximate one if configured, else the flat one."""
+    config = search_index_config(db_path)
+    if config is None:
+        return faiss.read_index(os.path.join(db_path, INDEX_FILE))
+    # IVF inverted lists are memory-mapped, so every worker shares one copy of them
+    io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if config["index_type"] == "ivfpq" else 0
+    index = faiss.read_index(os.path.join(db_path, SEARCH_INDEX_FILE), io_flags)
+    set_search_params(index, config["index_type"], config["params"])
+    return index
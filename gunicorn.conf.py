@@ -0,0 +1,45 @@
+"""Gunicorn settings; picked up automatically by `gunicorn app:app` run from the repo root.
+
+With preload (the default, GUNICORN_PRELOAD=0 to disable) the master
+imports app.py and loads the read-only resources (MiniLM, the FAISS index,
+the classifiers) before forking, so workers share those pages copy-on-write
+instead of each loading a copy. sample/measure_worker_memory.py reports the
+USS/PSS per worker with and without it.
+"""
+import gc
+import os
+
+os.environ.setdefault("GUNICORN_PRELOAD", "1")  # read by app.create_app()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = 120
+preload_app = os.environ["GUNICORN_PRELOAD"] == "1"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import resources
+    resources.wait()
+    # Move everything loaded so far out of the collector's reach: a collection in a
+    # worker would otherwise write to every object header and unshare their pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded resources: %s",
+                    {name: status["state"] for name, status in resources.status().items()})
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Load what was left for the workers (the ONNX backend and whatever depends on it)
+        from app import resources
+        resources.start()
+
+
+def worker_exit(server, worker):
+    # Write the chat messages and histories still queued before the worker goes away
+    from app import history_writer, message_writer
+    message_writer.close()
+    history_writer.close()
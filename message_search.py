@@ -0,0 +1,167 @@
+"""Full-text search over one user's stored chat messages.
+
+Every user's searches go through the database's full-text index, scoped to
+their own messages, so the same query ranks the same way for everyone:
+
+SQLite: conversation_fts is an external-content FTS5 table over
+conversation.message and conversation.user_id, with the porter tokenizer.
+The query matches the user's ID token in the user_id column AND the words
+in the message column, so FTS5 only reads the parts of the words' doclists
+that belong to the user's messages, and a common word costs a user with a
+few hundred messages about as much as those messages. Hits are ranked by
+bm25() over the message column. ensure_index() creates the table and the
+triggers that keep it current, and indexes existing rows; it rebuilds a
+table created without user_id.
+
+MySQL: conversation.message has a FULLTEXT index (declared on the
+Conversation model). InnoDB cannot scope the index by user, so MATCH ...
+AGAINST in natural language mode finds the matches of all users and
+user_id filters them.
+
+Other databases fall back to an unranked LIKE scan of the user's messages,
+newest first.
+
+Either way a message matches if it has any of the query's words, and
+messages with more of them, rarer ones in particular, rank first. Each hit
+gets a snippet of about SEARCH_SNIPPET_CHARS characters around its first
+matching word. The snippet is HTML-escaped, with the words in <mark>.
+"""
+import os
+import re
+import time
+import threading
+from markupsafe import escape
+from sqlalchemy import DateTime, text
+
+SEARCH_SNIPPET_CHARS = int(os.environ.get("SEARCH_SNIPPET_CHARS", "160"))
+SEARCH_MAX_TERMS = 16
+# InnoDB's default FULLTEXT stopwords, which MySQL ignores; dropped on SQLite too, where a
+# word in most messages would make the query rank most of the user's messages
+STOPWORDS = frozenset("a about an are as at be by com de en for from how i in is it la of on or "
+                      "that the this to was what when where who will with und www".split())
+
+FTS_TABLE = "conversation_fts"
+FTS_TRIGGERS = (f"{FTS_TABLE}_insert", f"{FTS_TABLE}_delete", f"{FTS_TABLE}_update")
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"message, user_id, content='conversation', content_rowid='id', tokenize='porter unicode61')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON conversation BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, message, user_id) VALUES (new.id, new.message, new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON conversation BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, message, user_id) VALUES ('delete', old.id, old.message, old.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF message, user_id ON conversation BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, message, user_id) VALUES ('delete', old.id, old.message, old.user_id);
+        INSERT INTO {FTS_TABLE} (rowid, message, user_id) VALUES (new.id, new.message, new.user_id);
+    END""",
+]
+# bm25 weights: the user_id column only scopes the match
+SQLITE_SEARCH = f"""SELECT c.id, c.session_id, c.person, c.timestamp, c.message, -bm25({FTS_TABLE}, 1.0, 0.0) AS score
+    FROM {FTS_TABLE} JOIN conversation AS c ON c.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :match AND c.user_id = :user_id
+    ORDER BY bm25({FTS_TABLE}, 1.0, 0.0) LIMIT :limit"""
+MYSQL_SEARCH = """SELECT id, session_id, person, timestamp, message, MATCH (message) AGAINST (:match) AS score
+    FROM conversation
+    WHERE user_id = :user_id AND MATCH (message) AGAINST (:match)
+    ORDER BY score DESC, timestamp DESC LIMIT :limit"""
+LIKE_SEARCH = """SELECT id, session_id, person, timestamp, message, NULL AS score FROM conversation
+    WHERE user_id = :user_id AND ({conditions}) ORDER BY timestamp DESC LIMIT :limit"""
+
+
+def query_terms(query):
+    """The distinct words of query other than stopwords, lowercased, in order."""
+    words = [word for word in re.findall(r"\w+", query.lower()) if word not in STOPWORDS]
+    return list(dict.fromkeys(words))[:SEARCH_MAX_TERMS]
+
+def snippet(message, terms, width=SEARCH_SNIPPET_CHARS):
+    """HTML of about width characters of message around its first matching word, words in <mark>."""
+    pattern = re.compile(r"\b(?:%s)\w*" % "|".join(map(re.escape, terms)), re.IGNORECASE)
+    first = pattern.search(message)
+    start = max(0, min(first.start() - width // 3, len(message) - width)) if first else 0
+    if start:
+        start = message.find(" ", start, first.start()) + 1 or start  # not mid-word
+    end = min(len(message), start + width)
+    if end < len(message):
+        space = message.rfind(" ", start, end)
+        end = space if space > start else end
+    window = message[start:end]
+    parts, position = [], 0
+    for match in pattern.finditer(window):
+        parts.append(str(escape(window[position:match.start()])))
+        parts.append(f"<mark>{escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(str(escape(window[position:])))
+    return ("…" if start else "") + "".join(parts) + ("…" if end < len(message) else "")
+
+def index_match(dialect, user_id, terms):
+    """The full-text query for user_id's messages with any of terms, in dialect's syntax."""
+    if dialect == "mysql":
+        return " ".join(terms)
+    # Quoted, so words like AND or NEAR are not FTS5 operators
+    words = " OR ".join(f'"{term}"' for term in terms)
+    return f'user_id : "{int(user_id)}" AND message : ({words})'
+
+def ensure_sqlite_index(conn):
+    """Create conversation_fts and its triggers, indexing existing messages when the table is new."""
+    table = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                         {"name": FTS_TABLE}).scalar()
+    if table is not None and "user_id" not in table:
+        # Created before searches were scoped by user: its triggers do not fill user_id
+        for trigger in FTS_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+        table = None
+    for statement in SQLITE_DDL:
+        conn.execute(text(statement))
+    if table is None:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+
+def search_rows(conn, dialect, user_id, terms, limit):
+    """The limit best of user_id's messages with any of terms."""
+    params = {"user_id": user_id, "limit": limit}
+    if dialect in ("mysql", "sqlite"):
+        statement = MYSQL_SEARCH if dialect == "mysql" else SQLITE_SEARCH
+        params["match"] = index_match(dialect, user_id, terms)
+    else:
+        conditions = " OR ".join(f"lower(message) LIKE :term{i}" for i in range(len(terms)))
+        statement = LIKE_SEARCH.format(conditions=conditions)
+        params.update({f"term{i}": f"%{term}%" for i, term in enumerate(terms)})
+    return [row._asdict() for row in conn.execute(text(statement).columns(timestamp=DateTime), params)]
+
+
+class MessageSearch:
+    def __init__(self, db):
+        self.db = db
+        self.queries = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def ensure_index(self):
+        """Create the SQLite FTS5 table and its triggers (see ensure_sqlite_index)."""
+        if self.db.engine.dialect.name != "sqlite":
+            return
+        with self.db.engine.begin() as conn:
+            ensure_sqlite_index(conn)
+
+    def _rows(self, user_id, terms, limit):
+        return search_rows(self.db.session.connection(), self.db.engine.dialect.name, user_id, terms, limit)
+
+    def search(self, user_id, query, limit=20):
+        """Best-ranked messages of user_id matching query, as dicts with an HTML snippet."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        started = time.perf_counter()
+        hits = [{"message_id": row["id"], "session_id": row["session_id"], "person": row["person"],
+                 "timestamp": row["timestamp"], "score": row["score"], "snippet": snippet(row["message"], terms)}
+                for row in self._rows(user_id, terms, limit)]
+        with self._lock:
+            self.queries += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+        return hits
+
+    def stats(self):
+        with self._lock:
+            return {"dialect": self.db.engine.dialect.name, "queries": self.queries,
+                    "avg_ms": self.total_ms / self.queries if self.queries else 0.0}
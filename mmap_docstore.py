@@ -0,0 +1,207 @@
+"""Columnar, memory-mapped docstore for the FAISS vector store.
+
+Replaces the pickled index.pkl written by FAISS.save_local. Row i of the
+docstore is vector i of index.faiss. Files under <db_path>/docstore/::
+
+    columns.json    {"rows": n, "columns": {name: "int" | "category"}}
+    text.bin        utf-8 chunk texts concatenated
+    offsets.npy     int64[n + 1] byte offsets of each text in text.bin
+    ids.npy         S<k>[n] docstore ids
+    <name>.npy      int64[n] for "int" columns (INT_MISSING when absent),
+                    int32[n] codes into <name>.json for "category" columns (-1 when absent)
+
+Everything is opened with np.load(mmap_mode="r"), so loading needs no
+pickle, costs a few mmap calls, the pages are shared by every process
+that maps them, and a Document is only built for the rows a search returns.
+
+The files of one build are published together (see store_versions.py),
+so the docstore rows and the FAISS ids always come from the same build.
+
+Convert an existing pickled store with:
+
+    python mmap_docstore.py vectorstore/db_faiss
+"""
+import os
+import sys
+import json
+from collections.abc import Mapping
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from faiss_index import INDEX_FILE, load_search_index
+from store_versions import publish_store, stage_store, store_path
+
+DOCSTORE_DIR = "docstore"
+INT_MISSING = np.iinfo(np.int64).min
+
+
+class RowIds(Mapping):
+    """index_to_docstore_id for an MmapDocstore: FAISS position i is docstore row i."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.rows:
+            raise KeyError(i)
+        return i
+
+    def __iter__(self):
+        return iter(range(self.rows))
+
+    def __len__(self):
+        return self.rows
+
+
+class MmapDocstore(Docstore):
+    """Read-only docstore looked up by row number."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "columns.json"), encoding="utf-8") as f:
+            spec = json.load(f)
+        self.rows = spec["rows"]
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r", allow_pickle=False)
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r", allow_pickle=False)
+        self.text = np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r") if self.offsets[-1] else b""
+        self.columns = {}
+        for name, kind in spec["columns"].items():
+            values = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+            categories = None
+            if kind == "category":
+                with open(os.path.join(path, f"{name}.json"), encoding="utf-8") as f:
+                    categories = json.load(f)
+            self.columns[name] = (values, categories)
+
+    def __len__(self):
+        return self.rows
+
+    def metadata(self, row):
+        metadata = {}
+        for name, (values, categories) in self.columns.items():
+            value = int(values[row])
+            if categories is None:
+                if value != INT_MISSING:
+                    metadata[name] = value
+            elif value >= 0:
+                metadata[name] = categories[value]
+        return metadata
+
+    def search(self, search):
+        row = int(search)
+        if not 0 <= row < self.rows:
+            return f"ID {search} not found."
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return Document(id=self.ids[row].decode("utf-8"), page_content=bytes(self.text[start:end]).decode("utf-8"),
+                        metadata=self.metadata(row))
+
+    def to_in_memory(self):
+        """Materialize every row, keyed by its real id, for stores that need editing."""
+        docs = {}
+        index_to_docstore_id = {}
+        for row in range(self.rows):
+            doc = self.search(row)
+            docs[doc.id] = doc
+            index_to_docstore_id[row] = doc.id
+        return InMemoryDocstore(docs), index_to_docstore_id
+
+
+def aside(path):
+    """Where to write the new contents of path before replace_aside() renames them over it."""
+    return path + ".tmp"
+
+def replace_aside(paths):
+    """Rename each file written to aside(path) over path, in order.
+
+    Never truncate a file in place: running workers may have it memory-mapped (a shrunk
+    mapping is a SIGBUS). Renamed over, the old inode stays valid until they reopen the store.
+    """
+    for path in paths:
+        os.replace(aside(path), path)
+
+
+def save_docstore(path, ids, documents):
+    """Write documents (in FAISS row order) to the columnar format under path."""
+    os.makedirs(path, exist_ok=True)
+    files = []
+
+    def target(name):
+        files.append(os.path.join(path, name))
+        return aside(files[-1])
+
+    offsets = [0]
+    metadatas = []
+    with open(target("text.bin"), "wb") as text_file:
+        for doc in documents:
+            data = doc.page_content.encode("utf-8")
+            text_file.write(data)
+            offsets.append(offsets[-1] + len(data))
+            metadatas.append(doc.metadata)
+
+    columns = {}
+    for name in sorted({key for metadata in metadatas for key in metadata}):
+        values = [metadata.get(name) for metadata in metadatas]
+        if all(value is None or (isinstance(value, int) and not isinstance(value, bool)) for value in values):
+            columns[name] = "int"
+            array = np.array([INT_MISSING if value is None else value for value in values], dtype=np.int64)
+        else:
+            columns[name] = "category"
+            categories = sorted({str(value) for value in values if value is not None})
+            codes = {category: code for code, category in enumerate(categories)}
+            array = np.array([-1 if value is None else codes[str(value)] for value in values], dtype=np.int32)
+            with open(target(f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(categories, f)
+        with open(target(f"{name}.npy"), "wb") as f:
+            np.save(f, array)
+
+    with open(target("offsets.npy"), "wb") as f:
+        np.save(f, np.array(offsets, dtype=np.int64))
+    with open(target("ids.npy"), "wb") as f:
+        np.save(f, np.array([str(doc_id).encode("utf-8") for doc_id in ids], dtype=bytes))
+    with open(target("columns.json"), "w", encoding="utf-8") as f:
+        json.dump({"rows": len(metadatas), "columns": columns}, f)
+    replace_aside(files)  # columns.json last
+
+
+def save_vectorstore(db, db_path):
+    """Save a langchain FAISS store as index.faiss plus a columnar docstore."""
+    os.makedirs(db_path, exist_ok=True)
+    ids = [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
+    save_docstore(os.path.join(db_path, DOCSTORE_DIR), ids, (db.docstore.search(doc_id) for doc_id in ids))
+    index_file = os.path.join(db_path, INDEX_FILE)
+    faiss.write_index(db.index, aside(index_file))
+    replace_aside([index_file])
+
+
+def load_vectorstore(db_path, embedding_model, editable=False):
+    """Open the published build of a store written by save_vectorstore without unpickling anything.
+
+    With editable=True the documents are copied into an InMemoryDocstore so
+    the store supports add_embeddings/delete (used by the ingestion script);
+    otherwise the approximate search index is used when one was built.
+    """
+    path = store_path(db_path)
+    docstore = MmapDocstore(os.path.join(path, DOCSTORE_DIR))
+    if editable:
+        index = faiss.read_index(os.path.join(path, INDEX_FILE))
+        return FAISS(embedding_model, index, *docstore.to_in_memory())
+    return FAISS(embedding_model, load_search_index(path), docstore, RowIds(len(docstore)))
+
+
+def vectorstore_exists(db_path):
+    path = store_path(db_path)
+    return os.path.exists(os.path.join(path, INDEX_FILE)) and \
+        os.path.exists(os.path.join(path, DOCSTORE_DIR, "columns.json"))
+
+
+if __name__ == "__main__":
+    # One-off migration of a store saved by FAISS.save_local (index.faiss + index.pkl)
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "vectorstore/db_faiss"
+    db = FAISS.load_local(db_path, None, allow_dangerous_deserialization=True)
+    staged = stage_store(db_path)
+    save_vectorstore(db, staged)
+    publish_store(db_path, staged)
+    print(f"Wrote {db.index.ntotal} rows to {staged}; index.faiss and index.pkl in {db_path} are no longer needed.")
@@ -0,0 +1,91 @@
+"""ONNX Runtime int8 backend for the sentence-transformers MiniLM embedding model.
+
+Export once (needs torch and transformers, which sentence-transformers
+already installs):
+
+    python onnx_embeddings.py export
+
+This writes model.onnx, its dynamically int8-quantized copy
+model_int8.onnx and the tokenizer files to ONNX_MODEL_PATH. Setting
+EMBEDDING_BACKEND=onnx then makes get_cached_embedding_model serve
+embeddings with OnnxEmbeddings instead of PyTorch; it reproduces the
+sentence-transformers pipeline (mean pooling over the attention mask,
+then L2 normalization). sample/benchmark_onnx.py checks cosine parity
+against the PyTorch embeddings and compares queries/sec and RSS.
+"""
+import os
+import sys
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", "vectorstore/onnx/all-MiniLM-L6-v2")
+MAX_SEQ_LENGTH = 256  # max_seq_length of all-MiniLM-L6-v2
+ONNX_BATCH_SIZE = 32
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def export_onnx(model_name=MODEL_NAME, output_dir=ONNX_MODEL_PATH, opset=17):
+    """Export the transformer to ONNX and write a dynamically int8-quantized copy next to it."""
+    import torch
+    from transformers import AutoModel
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in INPUT_NAMES), fp32_path,
+                          input_names=INPUT_NAMES, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+    int8_path = os.path.join(output_dir, "model_int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """Drop-in replacement for HuggingFaceEmbeddings(MODEL_NAME) running on ONNX Runtime."""
+
+    def __init__(self, model_dir=ONNX_MODEL_PATH, model_file="model_int8.onnx", threads=None):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def _embed(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np")
+        inputs = {name: encoded[name].astype(np.int64) for name in INPUT_NAMES if name in self.input_names}
+        hidden = self.session.run(None, inputs)[0]
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        # Sorted by length so each batch pads to similar sizes
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), ONNX_BATCH_SIZE):
+            batch = order[start:start + ONNX_BATCH_SIZE]
+            for i, vector in zip(batch, self._embed([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["export"]:
+        sys.exit("usage: python onnx_embeddings.py export [model_name] [output_dir]")
+    print("Wrote", export_onnx(*sys.argv[2:4]))
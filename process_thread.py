@@ -0,0 +1,32 @@
+"""A daemon thread per process, started on first use.
+
+Threads do not survive a fork: an object built in the gunicorn master
+(preload_app) has no background thread in the workers. ProcessThread
+remembers which process started its thread and starts another one the
+first time ensure() is called in a process that has none.
+"""
+import os
+import threading
+
+
+class ProcessThread:
+    def __init__(self, target, name, on_start=None):
+        self.target = target
+        self.name = name
+        self.on_start = on_start  # runs before each start, e.g. to replace queues copied from the parent
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def started(self):
+        """Whether the thread has been started in this process."""
+        return self._pid == os.getpid()
+
+    def ensure(self):
+        if self.started():
+            return
+        with self._lock:
+            if not self.started():
+                if self.on_start is not None:
+                    self.on_start()
+                threading.Thread(target=self.target, name=self.name, daemon=True).start()
+                self._pid = os.getpid()
@@ -0,0 +1,194 @@
+"""Background loading of the app's heavy resources.
+
+Each resource is registered with a loader and the names of the resources
+it is built from. start() runs the loaders on one daemon thread, in
+registration order, so Flask serves pages that need none of them while
+the rest is loading. (A single thread because concurrent first imports of
+the same package, e.g. sklearn from two unpickling loaders, can see it
+partially initialized.) get() waits up to wait_timeout seconds for a
+resource and then raises ResourceNotReady, which app.py turns into a 503
+with a Retry-After hint.
+
+Under gunicorn with preload_app (see gunicorn.conf.py) the master calls
+start(fork_safe_only=True) and wait() before forking, so the fork-safe
+resources are loaded once and their pages shared copy-on-write by every
+worker; each worker's start() then loads only what is left.
+
+A resource registered with recheck=seconds (e.g. the directory of the
+published vector store build) has its loader re-run from get() at most
+that often. When the value changes, it and every resource built from it
+are loaded again on a background thread, then swapped in together; until
+then requests keep using the old ones. reloads counts the swaps.
+"""
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceNotReady(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is still loading, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Resource:
+    def __init__(self, name, loader, requires, fork_safe, recheck):
+        self.name = name
+        self.loader = loader
+        self.requires = tuple(requires)
+        self.fork_safe = fork_safe
+        self.recheck = recheck
+        self.checked = time.monotonic()
+        self.reloads = 0
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.value = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def status(self):
+        seconds = None
+        if self.started is not None:
+            seconds = (self.finished or time.perf_counter()) - self.started
+        return {"state": self.state, "requires": list(self.requires), "seconds": seconds,
+                "reloads": self.reloads, "error": repr(self.error) if self.error else None}
+
+
+class ResourceRegistry:
+    def __init__(self, wait_timeout=10.0, retry_after=5):
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self._resources = {}
+        self._started_pid = None
+        self._thread = None
+        self.reloads = 0
+        self._reloading = None  # value a reload is running (or failed) for
+        self._lock = threading.Lock()
+
+    def resource(self, name, requires=(), fork_safe=True, recheck=None):
+        """Decorator registering loader(*required_values) as resource name.
+
+        fork_safe=False keeps a resource (e.g. one owning native thread
+        pools) out of the pre-fork load; workers load it after the fork.
+        recheck=seconds reloads it, and what is built from it, when the
+        loader starts returning something else.
+        """
+        def decorator(loader):
+            self._resources[name] = Resource(name, loader, requires, fork_safe, recheck)
+            return loader
+        return decorator
+
+    def start(self, fork_safe_only=False):
+        """Start loading everything not yet loaded in the background (once per process)."""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._thread = threading.Thread(target=self._load_all, args=(fork_safe_only,),
+                                        name="resource-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until the loader thread of this process is done."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _load_all(self, fork_safe_only):
+        for resource in list(self._resources.values()):
+            if resource.done.is_set():
+                continue
+            if fork_safe_only and not (resource.fork_safe and all(
+                    self._resources[name].done.is_set() for name in resource.requires)):
+                continue  # left for the workers, as is everything built from it
+            self._load(resource)
+
+    def _load(self, resource):
+        try:
+            values = []
+            for name in resource.requires:
+                required = self._resources[name]
+                if not required.done.is_set():
+                    raise RuntimeError(f"{resource.name} is registered before its requirement {name}")
+                if required.state == "failed":
+                    raise RuntimeError(f"required resource {name} failed to load")
+                values.append(required.value)
+            resource.state = "loading"
+            resource.started = time.perf_counter()
+            resource.value = resource.loader(*values)
+            resource.state = "ready"
+        except Exception as e:
+            resource.error = e
+            resource.state = "failed"
+            logger.exception("failed to load %s", resource.name)
+        finally:
+            resource.finished = time.perf_counter()
+            resource.done.set()
+            logger.info("resource %s %s in %.2fs", resource.name, resource.state,
+                        resource.finished - (resource.started or resource.finished))
+
+    def _dependents(self, name):
+        """name and every resource built from it, in registration (= load) order."""
+        names = [name]
+        for resource in self._resources.values():
+            if any(required in names for required in resource.requires):
+                names.append(resource.name)
+        return names
+
+    def _recheck(self):
+        now = time.monotonic()
+        for resource in self._resources.values():
+            if resource.recheck is None or resource.state != "ready" or now - resource.checked < resource.recheck:
+                continue
+            resource.checked = now
+            value = resource.loader(*(self._resources[name].value for name in resource.requires))
+            names = self._dependents(resource.name)
+            with self._lock:
+                if value == resource.value or value == self._reloading:
+                    continue
+                if not all(self._resources[name].done.is_set() for name in names):
+                    continue  # still loading the first time
+                self._reloading = value
+            threading.Thread(target=self._reload, args=(names, value), name="resource-reloader", daemon=True).start()
+
+    def _reload(self, names, value):
+        values = {names[0]: value}
+        started = time.perf_counter()
+        try:
+            for name in names[1:]:
+                resource = self._resources[name]
+                values[name] = resource.loader(*(values.get(required, self._resources[required].value)
+                                                 for required in resource.requires))
+        except Exception:
+            # Keep serving the loaded ones; this value is not retried until it changes again
+            logger.exception("failed to reload %s for %r", names[0], value)
+            return
+        with self._lock:
+            for name, new_value in values.items():
+                self._resources[name].value = new_value
+                self._resources[name].reloads += 1
+            self.reloads += 1
+            self._reloading = None
+        logger.info("reloaded %s in %.2fs", ", ".join(names), time.perf_counter() - started)
+
+    def get(self, name, timeout=None):
+        """Return the loaded resource, re-raising its load error if it failed."""
+        resource = self._resources[name]
+        if not resource.done.wait(self.wait_timeout if timeout is None else timeout):
+            raise ResourceNotReady(name, self.retry_after)
+        if resource.state == "failed":
+            raise resource.error
+        self._recheck()
+        return resource.value
+
+    def is_ready(self, name):
+        return self._resources[name].state == "ready"
+
+    def ready(self):
+        return all(resource.state == "ready" for resource in self._resources.values())
+
+    def status(self):
+        return {name: resource.status() for name, resource in self._resources.items()}
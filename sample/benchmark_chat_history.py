@@ -0,0 +1,155 @@
+import time
+import uuid
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, text
+
+# Tables as app.py declares them (Conversation, ChatSession), minus the foreign keys
+CONVERSATION_DDL = """CREATE TABLE conversation (
+    id INTEGER PRIMARY KEY {autoincrement},
+    session_id VARCHAR(255) NOT NULL,
+    user_id INTEGER NOT NULL,
+    person VARCHAR(10) NOT NULL,
+    timestamp DATETIME,
+    message TEXT NOT NULL)"""
+CHAT_SESSION_DDL = """CREATE TABLE chat_session (
+    id VARCHAR(255) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    last_active DATETIME NOT NULL,
+    title VARCHAR(100),
+    message_count INTEGER NOT NULL)"""
+CONVERSATION_INDEX = "CREATE INDEX ix_conversation_user_session_time ON conversation (user_id, session_id, timestamp)"
+CHAT_SESSION_INDEX = "CREATE INDEX ix_chat_session_user_active ON chat_session (user_id, last_active)"
+# ChatSession rows for existing conversations, as app.backfill_chat_sessions() builds them (without titles)
+BACKFILL = """INSERT INTO chat_session (id, user_id, created_at, last_active, message_count)
+    SELECT session_id, user_id, MIN(timestamp), MAX(timestamp), COUNT(*) FROM conversation
+    GROUP BY session_id, user_id"""
+
+QUERIES = {
+    # /chat before: every session ID the user has, from the messages themselves
+    "chat list (distinct)": "SELECT DISTINCT session_id FROM conversation WHERE user_id = :user_id",
+    # /chat after
+    "chat list (chat_session)": "SELECT id, title, last_active FROM chat_session WHERE user_id = :user_id "
+                                "ORDER BY last_active DESC",
+    # /chat_history/<session_id>
+    "session history": "SELECT id, person, timestamp, message FROM conversation "
+                       "WHERE session_id = :session_id AND user_id = :user_id ORDER BY timestamp, id",
+}
+INSERT_BATCH = 50_000
+
+
+# Latency and query plans of the chat sidebar and chat history queries on a large seeded
+# Conversation table, without indexes (the old schema) and with the composite index and
+# the ChatSession table. Uses SQLite unless --db-url points at MySQL, e.g.
+#   python sample/benchmark_chat_history.py --rows 10000000
+#   python sample/benchmark_chat_history.py --db-url mysql+mysqlconnector://root:pw@localhost/bench
+# The seeded table is kept for the next run; --reseed rebuilds it.
+def seed(engine, args):
+    rng = np.random.default_rng(args.seed)
+    sessions = args.rows // args.messages_per_session
+    session_ids = [str(uuid.UUID(int=int(value), version=4)) for value in rng.integers(0, 2**63, sessions)]
+    owners = rng.integers(1, args.users + 1, sessions)
+    start = datetime(2024, 1, 1)
+    autoincrement = "AUTO_INCREMENT" if engine.dialect.name == "mysql" else ""
+    placeholder = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    insert = (f"INSERT INTO conversation (session_id, user_id, person, timestamp, message) "
+              f"VALUES ({', '.join([placeholder] * 5)})")
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS chat_session"))
+        conn.execute(text("DROP TABLE IF EXISTS conversation"))
+        conn.execute(text(CONVERSATION_DDL.format(autoincrement=autoincrement)))
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for offset in range(0, args.rows, INSERT_BATCH):
+            # Messages of all sessions interleaved in time, as real traffic writes them
+            count = min(INSERT_BATCH, args.rows - offset)
+            picks = rng.integers(0, sessions, count)
+            cursor.executemany(insert, [
+                (session_ids[s], int(owners[s]), "user" if (offset + i) % 2 == 0 else "bot",
+                 start + timedelta(seconds=offset + i), f"message {offset + i} of the seeded conversation table")
+                for i, s in enumerate(picks)])
+            raw.commit()
+            print(f"\rseeded {offset + count:,}/{args.rows:,} rows", end="", flush=True)
+        print()
+    finally:
+        raw.close()
+
+def timed(engine, statement):
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(statement))
+    return time.perf_counter() - started
+
+def explain(conn, engine, query, params):
+    if engine.dialect.name == "sqlite":
+        return [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + query), params)]
+    rows = conn.execute(text("EXPLAIN " + query), params).mappings()
+    return [f"table={row['table']} type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}"
+            for row in rows]
+
+def measure(engine, names, samples, repeats):
+    with engine.connect() as conn:
+        for name in names:
+            query = QUERIES[name]
+            latencies = []
+            for params in samples[:repeats]:
+                started = time.perf_counter()
+                conn.execute(text(query), params).fetchall()
+                latencies.append((time.perf_counter() - started) * 1000)
+            print(f"  {name:<26} p50 {np.percentile(latencies, 50):9.2f} ms   p95 {np.percentile(latencies, 95):9.2f} ms"
+                  f"   ({len(latencies)} queries)")
+            for line in explain(conn, engine, query, samples[0]):
+                print(f"      plan: {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation queries with and without the composite index.")
+    parser.add_argument("--db-url", default="sqlite:///chat_history_bench.sqlite")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--messages-per-session", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200, help="queries per measurement with the indexes")
+    parser.add_argument("--scan-queries", type=int, default=5, help="queries per measurement without them")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reseed", action="store_true", help="rebuild the seeded table")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    with engine.connect() as conn:
+        exists = engine.dialect.has_table(conn, "conversation")
+        rows = conn.execute(text("SELECT COUNT(*) FROM conversation")).scalar() if exists else 0
+    if args.reseed or rows != args.rows:
+        seed(engine, args)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS chat_session"))
+        if engine.dialect.name == "mysql":
+            indexes = {row[2] for row in conn.execute(text("SHOW INDEX FROM conversation"))}
+            if "ix_conversation_user_session_time" in indexes:
+                conn.execute(text("DROP INDEX ix_conversation_user_session_time ON conversation"))
+        else:
+            conn.execute(text("DROP INDEX IF EXISTS ix_conversation_user_session_time"))
+
+    rng = np.random.default_rng(args.seed + 1)
+    with engine.connect() as conn:
+        # Sessions picked by message, so busier sessions come up more often, as on the site
+        sessions = [conn.execute(text("SELECT session_id, user_id FROM conversation WHERE id = :id"), {"id": int(i)}).one()
+                    for i in rng.integers(1, args.rows + 1, args.queries)]
+    samples = [{"session_id": session_id, "user_id": user_id} for session_id, user_id in sessions]
+    print(f"{args.rows:,} conversation rows, {args.rows // args.messages_per_session:,} sessions, "
+          f"{args.users:,} users ({engine.dialect.name})")
+
+    print("\nwithout indexes (old schema)")
+    measure(engine, ["chat list (distinct)", "session history"], samples, args.scan_queries)
+
+    print(f"\ncomposite index built in {timed(engine, CONVERSATION_INDEX):.1f}s")
+    elapsed = timed(engine, CHAT_SESSION_DDL) + timed(engine, BACKFILL) + timed(engine, CHAT_SESSION_INDEX)
+    print(f"chat_session backfilled and indexed in {elapsed:.1f}s")
+    print("\nwith ix_conversation_user_session_time and chat_session")
+    measure(engine, ["chat list (distinct)", "chat list (chat_session)", "session history"], samples, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from langchain.chains import RetrievalQA
+from langchain.retrievers import ContextualCompressionRetriever
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+from context_compression import EmbeddingSentenceCompressor
+from token_budget import count_tokens
+
+QUESTIONS = [
+    "What is diabetes?",
+    "What are the symptoms of asthma?",
+    "How is hypertension treated?",
+    "What causes migraine headaches?",
+    "Which medicines are used for arthritis?",
+    "What is the treatment for pneumonia?",
+]
+
+
+# End-to-end /query latency and prompt size with and without context compression.
+# Runs the real chain (retriever + Groq), alternating the two variants per question.
+def run_chain(chain, question):
+    started = time.perf_counter()
+    response = chain.invoke({'query': question})
+    elapsed = (time.perf_counter() - started) * 1000
+    context_tokens = sum(count_tokens(doc.page_content) for doc in response["source_documents"])
+    return elapsed, context_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and prompt tokens with and without context compression.")
+    parser.add_argument("--questions", help="file with one question per line (default: built-in sample)")
+    parser.add_argument("--rounds", type=int, default=3, help="times each question is asked per variant")
+    args = parser.parse_args()
+
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    get = lambda name: app.resources.get(name, timeout=600)
+    retriever = get('retriever')
+    chain_kwargs = dict(llm=get('llm'), chain_type="stuff", return_source_documents=True,
+                        chain_type_kwargs={'prompt': get('prompt')})
+    plain = RetrievalQA.from_chain_type(retriever=retriever, **chain_kwargs)
+    compressed = get('qa_chain') if get('compressor') is not None else RetrievalQA.from_chain_type(
+        retriever=ContextualCompressionRetriever(
+            base_compressor=EmbeddingSentenceCompressor(embeddings=get('embedding_model')),
+            base_retriever=retriever),
+        **chain_kwargs)
+
+    results = {"plain": [], "compressed": []}
+    for _ in range(args.rounds):
+        for question in questions:
+            results["plain"].append(run_chain(plain, question))
+            results["compressed"].append(run_chain(compressed, question))
+
+    for name, runs in results.items():
+        latencies = [latency for latency, _ in runs]
+        tokens = [context_tokens for _, context_tokens in runs]
+        print(f"{name:<11} context tokens: {np.mean(tokens):.0f}  "
+              f"p50: {np.percentile(latencies, 50):.0f} ms  p95: {np.percentile(latencies, 95):.0f} ms")
+    saved = np.mean([t for _, t in results["plain"]]) - np.mean([t for _, t in results["compressed"]])
+    change = np.median([l for l, _ in results["compressed"]]) - np.median([l for l, _ in results["plain"]])
+    print(f"tokens saved per request: {saved:.0f}  p50 latency change: {change:+.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
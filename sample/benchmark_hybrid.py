@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_cache import get_cached_embedding_model, QueryEmbeddingLRU
+from mmap_docstore import load_vectorstore
+from bm25_index import HybridRetriever, load_bm25_index
+
+DB_FAISS_PATH = "vectorstore/db_faiss"
+
+
+# Latency of the hybrid (dense + BM25 + RRF) retriever against the dense-only k=3 retriever.
+# Queries are short word windows cut from stored chunks; their embeddings are computed once
+# up front so both retrievers are timed on search and fusion only, not on the transformer.
+def sample_queries(docstore, num_queries, words, seed=0):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for row in rng.choice(len(docstore), min(num_queries, len(docstore)), replace=False):
+        tokens = docstore.search(int(row)).page_content.split()
+        start = int(rng.integers(0, max(1, len(tokens) - words)))
+        queries.append(" ".join(tokens[start:start + words]) or "diabetes")
+    return queries
+
+def time_retriever(name, retriever, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        retriever.invoke(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    p50, p99 = np.percentile(latencies, 50), np.percentile(latencies, 99)
+    print(f"{name:<10} p50: {p50:.3f} ms  p99: {p99:.3f} ms")
+    return p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of hybrid BM25 + dense retrieval vs dense only.")
+    parser.add_argument("--db", default=DB_FAISS_PATH, help="vector store directory")
+    parser.add_argument("--queries", type=int, default=500, help="number of sampled queries")
+    parser.add_argument("--words", type=int, default=6, help="words per sampled query")
+    parser.add_argument("--fetch-k", type=int, default=20, help="candidates per ranking before fusion")
+    args = parser.parse_args()
+
+    embedding_model = QueryEmbeddingLRU(get_cached_embedding_model("sentence-transformers/all-MiniLM-L6-v2"),
+                                        max_size=args.queries)
+    vectorstore = load_vectorstore(args.db, embedding_model)
+    bm25 = load_bm25_index(args.db)
+    if bm25 is None:
+        sys.exit(f"No BM25 index in {args.db}; rebuild it with sample/create_memory_for_llm.py")
+
+    queries = sample_queries(vectorstore.docstore, args.queries, args.words)
+    for query in queries:
+        embedding_model.embed_query(query)
+
+    dense = vectorstore.as_retriever(search_kwargs={'k': 3})
+    hybrid = HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=3, fetch_k=args.fetch_k)
+    time_retriever("warmup", hybrid, queries[:20])
+    dense_p50, dense_p99 = time_retriever("dense", dense, queries)
+    hybrid_p50, hybrid_p99 = time_retriever("hybrid", hybrid, queries)
+    print(f"hybrid overhead  p50: {hybrid_p50 - dense_p50:+.3f} ms  p99: {hybrid_p99 - dense_p99:+.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
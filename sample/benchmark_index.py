@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from store_versions import store_path
+from faiss_index import INDEX_FILE, INDEX_TYPES, build_index, index_memory, index_params, index_vectors, load_search_index
+
+DB_FAISS_PATH = "vectorstore/db_faiss"
+K = 3
+
+
+# Compare approximate index types against the exact flat index of the saved store.
+# Queries are stored chunk vectors with a little gaussian noise, so no embedding model is needed.
+def sample_queries(vectors, num_queries, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    queries = vectors[rows] + rng.normal(scale=noise, size=(len(rows), vectors.shape[1]))
+    return np.ascontiguousarray(queries, dtype=np.float32)
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(row_found) & set(row_truth)) for row_found, row_truth in zip(found, truth))
+    return hits / truth.size
+
+def benchmark(name, index, queries, truth):
+    # One query per search call, like the /query route
+    latencies = []
+    found = np.empty_like(truth)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], K)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found[i] = ids[0]
+    print(f"{name:<28} recall@{K}: {recall_at_k(found, truth):.3f}  "
+          f"p50: {np.percentile(latencies, 50):.3f} ms  p99: {np.percentile(latencies, 99):.3f} ms  "
+          f"memory: {index_memory(index) / 1024 / 1024:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@3 and latency of FAISS index types on the saved store.")
+    parser.add_argument("--db", default=DB_FAISS_PATH, help="vector store directory")
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--queries", type=int, default=1000, help="number of sampled queries")
+    parser.add_argument("--noise", type=float, default=0.01, help="std of the noise added to sampled queries")
+    parser.add_argument("--threads", type=int, default=1, help="faiss OpenMP threads")
+    parser.add_argument("--hnsw-m", type=int)
+    parser.add_argument("--hnsw-ef-construction", type=int)
+    parser.add_argument("--hnsw-ef-search", type=int)
+    parser.add_argument("--ivf-nlist", type=int)
+    parser.add_argument("--ivf-nprobe", type=int)
+    parser.add_argument("--pq-m", type=int)
+    parser.add_argument("--pq-nbits", type=int)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    db_path = store_path(args.db)  # the published build
+    flat_index = faiss.read_index(os.path.join(db_path, INDEX_FILE))
+    vectors = index_vectors(flat_index)
+    queries = sample_queries(vectors, args.queries, args.noise)
+    _, truth = flat_index.search(queries, K)
+    print(f"{flat_index.ntotal} vectors, dim {flat_index.d}, {len(queries)} queries")
+
+    for index_type in args.index_types:
+        params = index_params(index_type, m=args.hnsw_m, ef_construction=args.hnsw_ef_construction,
+                              ef_search=args.hnsw_ef_search, nlist=args.ivf_nlist, nprobe=args.ivf_nprobe,
+                              pq_m=args.pq_m, pq_nbits=args.pq_nbits)
+        started = time.perf_counter()
+        index = build_index(vectors, index_type, params)
+        print(f"built {index_type} {params} in {time.perf_counter() - started:.1f}s")
+        benchmark(index_type, index, queries, truth)
+
+    # The index app.py actually serves, if ingestion built an approximate one
+    benchmark("saved search index", load_search_index(db_path), queries, truth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_cache import load_embedding_backend
+from onnx_embeddings import MODEL_NAME
+
+TEXTS = [
+    "What is diabetes?",
+    "hi doctor",
+    "What are the early symptoms of Parkinson's disease?",
+    "Metformin is commonly prescribed as first-line therapy for type 2 diabetes mellitus.",
+    "Asthma is a chronic inflammatory disease of the airways characterized by wheezing and shortness of breath.",
+    "How should hypertension be managed in elderly patients with chronic kidney disease?",
+    "Appendicitis usually presents with periumbilical pain that migrates to the right lower quadrant.",
+    "Side effects of ACE inhibitors include a dry cough and, rarely, angioedema.",
+]
+PARITY_THRESHOLD = 0.99
+
+
+# Parity and speed of the ONNX int8 backend against PyTorch. Each backend runs in its own
+# process so the reported peak RSS belongs to that backend alone.
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_worker(backend, seconds, output):
+    embeddings, _ = load_embedding_backend(MODEL_NAME, backend)
+    np.save(output, np.asarray(embeddings.embed_documents(TEXTS), dtype=np.float32))
+    embeddings.embed_query(TEXTS[0])  # warm up
+    queries = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        embeddings.embed_query(TEXTS[queries % len(TEXTS)])
+        queries += 1
+    print(json.dumps({"qps": queries / (time.perf_counter() - started), "peak_rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cosine parity, queries/sec and RSS of the ONNX int8 embeddings.")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each queries/sec run")
+    parser.add_argument("--threshold", type=float, default=PARITY_THRESHOLD, help="minimum cosine similarity")
+    parser.add_argument("--worker", choices=["torch", "onnx"], help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return run_worker(args.worker, args.seconds, args.output)
+
+    vectors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("torch", "onnx"):
+            output = os.path.join(tmp, f"{backend}.npy")
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", backend,
+                                     "--seconds", str(args.seconds), "--output", output],
+                                    check=True, capture_output=True, text=True)
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            vectors[backend] = np.load(output)
+            rss = f"{stats['peak_rss_mb']:.0f} MB" if stats["peak_rss_mb"] is not None else "n/a"
+            print(f"{backend:<6} queries/sec: {stats['qps']:.1f}  peak RSS: {rss}")
+
+    torch_vectors, onnx_vectors = vectors["torch"], vectors["onnx"]
+    cosine = (torch_vectors * onnx_vectors).sum(axis=1) / (
+        np.linalg.norm(torch_vectors, axis=1) * np.linalg.norm(onnx_vectors, axis=1))
+    print(f"cosine similarity torch vs onnx: min {cosine.min():.4f}  mean {cosine.mean():.4f}")
+    if cosine.min() < args.threshold:
+        sys.exit(f"parity check failed: min cosine {cosine.min():.4f} < {args.threshold}")
+    print("parity check passed")
+
+
+if __name__ == "__main__":
+    main()
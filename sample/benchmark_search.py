@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, text
+
+# Ahead of sample/, whose app.py is an older copy of the app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from message_search import FTS_TABLE, ensure_sqlite_index, query_terms, search_rows, snippet
+
+# Conversation as app.py declares it, minus the foreign key
+CONVERSATION_DDL = """CREATE TABLE conversation (
+    id INTEGER PRIMARY KEY {autoincrement},
+    session_id VARCHAR(255) NOT NULL,
+    user_id INTEGER NOT NULL,
+    person VARCHAR(10) NOT NULL,
+    timestamp DATETIME,
+    message TEXT NOT NULL)"""
+CONVERSATION_INDEX = "CREATE INDEX ix_conversation_user_session_time ON conversation (user_id, session_id, timestamp)"
+MYSQL_FULLTEXT = "CREATE FULLTEXT INDEX ft_conversation_message ON conversation (message)"
+
+MEDICAL_WORDS = ("appendicitis abdominal pain fever nausea vomiting diabetes insulin glucose hypertension "
+                 "asthma inhaler wheezing pneumonia cough antibiotics migraine headache aura fracture cast "
+                 "anemia iron fatigue thyroid hypothyroidism levothyroxine arrhythmia palpitations ecg "
+                 "stroke aphasia tpa sepsis lactate cultures dermatitis rash eczema steroid cholecystitis "
+                 "gallstones ultrasound meningitis lumbar puncture rigidity").split()
+QUERIES = ["appendicitis", "appendicitis case", "abdominal pain fever", "lumbar puncture meningitis",
+           "pain", "the patient", "thyroid fatigue", "chest pain ecg"]
+INSERT_BATCH = 20_000
+SEARCH_USER = 1
+SMALL_USER = 2  # one of the other users, with about (rows - user messages) / users messages
+
+
+# Latency of /search's full-text query over one user's messages in a table shared with other
+# users, for a user with many messages and one with few. Messages are drawn from a
+# Zipf-distributed vocabulary with medical words at random ranks. Uses SQLite (FTS5) unless
+# --db-url points at MySQL (FULLTEXT), e.g.
+#   python sample/benchmark_search.py --rows 1000000 --user-messages 100000
+#   python sample/benchmark_search.py --db-url mysql+mysqlconnector://root:pw@localhost/bench
+# The seeded table is kept for the next run (its FTS5 table is rebuilt if it predates the
+# user_id column); --reseed rebuilds it.
+def make_vocabulary(rng, args):
+    """The vocabulary, most frequent word first."""
+    vocabulary = np.array(MEDICAL_WORDS + ["the", "patient", "and", "with"]
+                          + [f"word{i}" for i in range(args.vocabulary)])
+    rng.shuffle(vocabulary)
+    return vocabulary
+
+def seed(engine, args):
+    rng = np.random.default_rng(args.seed)
+    vocabulary = make_vocabulary(rng, args)
+    autoincrement = "AUTO_INCREMENT" if engine.dialect.name == "mysql" else ""
+    placeholder = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    insert = (f"INSERT INTO conversation (session_id, user_id, person, timestamp, message) "
+              f"VALUES ({', '.join([placeholder] * 5)})")
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+        conn.execute(text("DROP TABLE IF EXISTS conversation"))
+        conn.execute(text(CONVERSATION_DDL.format(autoincrement=autoincrement)))
+        conn.execute(text(CONVERSATION_INDEX))
+    start = datetime(2024, 1, 1)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for offset in range(0, args.rows, INSERT_BATCH):
+            count = min(INSERT_BATCH, args.rows - offset)
+            # The search user's messages are spread through the table, as real traffic writes them
+            owners = np.where(rng.random(count) < args.user_messages / args.rows,
+                              SEARCH_USER, rng.integers(2, args.users + 1, count))
+            lengths = rng.integers(5, 60, count)
+            ranks = np.minimum(rng.zipf(1.1, lengths.sum()), len(vocabulary)) - 1
+            words = np.split(vocabulary[ranks], np.cumsum(lengths)[:-1])
+            cursor.executemany(insert, [
+                (f"session-{owner}-{(offset + i) // 400}", int(owner), "user" if i % 2 == 0 else "bot",
+                 start + timedelta(seconds=offset + i), " ".join(message_words))
+                for i, (owner, message_words) in enumerate(zip(owners, words))])
+            raw.commit()
+            print(f"\rseeded {offset + count:,}/{args.rows:,} rows", end="", flush=True)
+        print()
+    finally:
+        raw.close()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        if engine.dialect.name == "mysql":
+            conn.execute(text(MYSQL_FULLTEXT))
+        else:
+            ensure_sqlite_index(conn)
+    print(f"full-text index built in {time.perf_counter() - started:.1f}s")
+
+def search(conn, engine, user_id, terms, limit):
+    rows = search_rows(conn, engine.dialect.name, user_id, terms, limit)
+    return [snippet(row["message"], terms) for row in rows]
+
+def timed(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return result, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search latency for a user with many messages.")
+    parser.add_argument("--db-url", default="sqlite:///search_bench.sqlite")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--user-messages", type=int, default=100_000, help="messages of the searching user")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reseed", action="store_true", help="rebuild the seeded table")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    with engine.connect() as conn:
+        exists = engine.dialect.has_table(conn, "conversation")
+        rows = conn.execute(text("SELECT COUNT(*) FROM conversation")).scalar() if exists else 0
+    if args.reseed or rows != args.rows:
+        seed(engine, args)
+    elif engine.dialect.name == "sqlite":
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            ensure_sqlite_index(conn)
+        print(f"full-text index checked in {time.perf_counter() - started:.1f}s")
+    with engine.connect() as conn:
+        print(f"{args.rows:,} conversation rows ({engine.dialect.name})")
+        for user_id in (SEARCH_USER, SMALL_USER):
+            messages = conn.execute(text("SELECT COUNT(*) FROM conversation WHERE user_id = :user_id"),
+                                    {"user_id": user_id}).scalar()
+            print(f"\nuser {user_id}, {messages:,} messages")
+            print(f"  {'query':<28}{'p50':>12}{'p95':>12}{'hits':>6}")
+            # The most frequent word, in about a fifth of all messages
+            for query in QUERIES + [str(make_vocabulary(np.random.default_rng(args.seed), args)[0])]:
+                terms = query_terms(query)
+                snippets, latencies = timed(lambda: search(conn, engine, user_id, terms, args.limit), args.repeats)
+                print(f"  {query:<28}{np.percentile(latencies, 50):9.2f} ms{np.percentile(latencies, 95):9.2f} ms"
+                      f"{len(snippets):>6}")
+        print(f"\ntop hit for {QUERIES[0]!r}: {search(conn, engine, SEARCH_USER, query_terms(QUERIES[0]), 1)[:1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,288 @@
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
-# 1. load raw pdf
+# Shared modules live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_cache import get_cached_embedding_model
+from mmap_docstore import DOCSTORE_DIR, MmapDocstore, load_vectorstore, save_vectorstore, vectorstore_exists
+from bm25_index import BM25_DIR, build_bm25_index
+from faiss_index import INDEX_TYPES, index_params, save_search_index, search_index_config
+from store_versions import publish_store, stage_store, store_path
+
 DATA_PATH = "data/"
-def load_pdf_file(data):
-    loader= DirectoryLoader(data,
-                            glob="*.pdf",
-                            loader_cls=PyPDFLoader)
+DB_FAISS_PATH = "vectorstore/db_faiss"
+PAGES_PER_TASK = 16     # pages extracted by one worker process per task
+EMBED_BATCH_SIZE = 256  # chunks embedded and added to FAISS at a time
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+MANIFEST_FILE = "manifest.json"
+
+
+class IngestStats:
+    """Running page/chunk counters for throughput reporting."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pages = 0
+        self.chunks = 0
+        self.skipped_pages = 0
+        self.deleted_chunks = 0
+
+    def report(self, label="progress"):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(f"[{label}] pages: {self.pages} ({self.pages / elapsed:.1f} pages/sec), "
+              f"chunks: {self.chunks} ({self.chunks / elapsed:.1f} chunks/sec), "
+              f"unchanged pages: {self.skipped_pages}, deleted chunks: {self.deleted_chunks}, "
+              f"elapsed: {elapsed:.1f}s")
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Content hashes of every file, page and chunk stored in the FAISS index.
+
+    Layout of manifest.json::
+
+        {"settings": {...},
+         "files": {source: {"sha256": ..., "pages": {page: {"sha256": ..., "chunk_ids": [...]}}}}}
+
+    Chunk ids are content hashes too, so they double as the FAISS docstore ids.
+    """
+
+    def __init__(self, settings, files=None):
+        self.settings = settings
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, db_path, settings):
+        """Return the saved manifest, or None if missing or built with other settings."""
+        path = os.path.join(db_path, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("settings") != settings:
+            return None
+        return cls(settings, data.get("files", {}))
+
+    def save(self, db_path):
+        path = os.path.join(db_path, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f)
+        os.replace(tmp_path, path)
+
+    def file_unchanged(self, source, file_hash):
+        return self.files.get(source, {}).get("sha256") == file_hash
+
+    def pages(self, source):
+        return self.files.setdefault(source, {"sha256": None, "pages": {}})["pages"]
+
+
+# 1. extract raw pdf pages in a process pool
+def list_pdf_files(data):
+    return sorted(os.path.join(data, name) for name in os.listdir(data) if name.lower().endswith(".pdf"))
 
-    documents=loader.load()
-    return documents
-documents = load_pdf_file(data=DATA_PATH)
-print("Length of pdf pages: ", len(documents))
+def page_tasks(pdf_files, pages_per_task):
+    for path in pdf_files:
+        num_pages = len(PdfReader(path).pages)
+        for start in range(0, num_pages, pages_per_task):
+            yield path, start, min(start + pages_per_task, num_pages)
 
-# 2. create chunks
-def create_chunks(extracted_data):
-    text_splitter=RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    text_chunks = text_splitter.split_documents(extracted_data)
-    return text_chunks
+def extract_pages(task):
+    """Worker: return (source, page, text) for a page range of one pdf."""
+    path, start, end = task
+    reader = PdfReader(path)
+    return [(path, page, reader.pages[page].extract_text() or "") for page in range(start, end)]
 
-text_chunks = create_chunks(extracted_data=documents)
-print("length of text_chunks = ",len(text_chunks))
+def iter_pages(pdf_files, stats, workers, pages_per_task=PAGES_PER_TASK):
+    """Yield pages in order while keeping only a bounded window of tasks in flight."""
+    tasks = page_tasks(pdf_files, pages_per_task)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(extract_pages, task))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append(executor.submit(extract_pages, next_task))
+            stats.pages += len(pages)
+            yield from pages
 
 
-# 3. create vector embeddings
+# 2. keep only new or changed pages, dropping vectors of pages that changed
+def delete_chunks(db, chunk_ids, stats):
+    if db is not None and chunk_ids:
+        db.delete(chunk_ids)
+        stats.deleted_chunks += len(chunk_ids)
+
+def iter_changed_pages(pages, manifest, db, stats, seen_pages):
+    for source, page, text in pages:
+        page_hash = sha256_text(text)
+        seen_pages.setdefault(source, set()).add(str(page))
+        entry = manifest.pages(source).get(str(page))
+        if entry is not None and entry["sha256"] == page_hash:
+            stats.skipped_pages += 1
+            continue
+        if entry is not None:
+            delete_chunks(db, entry["chunk_ids"], stats)
+        yield source, page, text, page_hash
+
+
+# 3. create chunks as the pages stream in
+def get_text_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+def iter_chunks(pages, text_splitter, manifest):
+    """Yield (chunk_id, document) pairs and record each page's chunk ids in the manifest."""
+    for source, page, text, page_hash in pages:
+        # Same metadata PyPDFLoader produced, so the retriever output is unchanged
+        chunks = text_splitter.split_documents([Document(page_content=text, metadata={"source": source, "page": page})])
+        chunk_ids = [sha256_text(f"{source}:{page}:{i}:{chunk.page_content}") for i, chunk in enumerate(chunks)]
+        manifest.pages(source)[str(page)] = {"sha256": page_hash, "chunk_ids": chunk_ids}
+        yield from zip(chunk_ids, chunks)
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# 4. create vector embeddings (chunks embedded by an earlier run come from the on-disk cache)
 def get_embedding_model():
-    embedding_model=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embedding_model = get_cached_embedding_model(EMBEDDING_MODEL_NAME)
     return embedding_model
 
-embedding_model=get_embedding_model()
 
-# # 4. store embeddings in FAISS
-DB_FAISS_PATH="vectorstore/db_faiss"
-db=FAISS.from_documents(text_chunks, embedding_model)
-db.save_local(DB_FAISS_PATH)
+# 5. embed each batch and add it to the FAISS store
+def build_vectorstore(chunk_batches, embedding_model, stats, db=None):
+    for batch in chunk_batches:
+        ids = [chunk_id for chunk_id, _ in batch]
+        texts = [chunk.page_content for _, chunk in batch]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        text_embeddings = list(zip(texts, embedding_model.embed_documents(texts)))
+        if db is None:
+            db = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=ids)
+        else:
+            db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        stats.chunks += len(batch)
+        stats.report()
+    return db
+
+
+def load_existing(db_path, embedding_model, settings):
+    """Load the published store and its manifest, or start from scratch if either is missing."""
+    manifest = Manifest.load(store_path(db_path), settings)
+    if manifest is None or not vectorstore_exists(db_path):
+        return None, Manifest(settings)
+    db = load_vectorstore(db_path, embedding_model, editable=True)
+    return db, manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store from the PDFs in data/.")
+    parser.add_argument("--data", default=DATA_PATH, help="directory containing the pdf files")
+    parser.add_argument("--output", default=DB_FAISS_PATH, help="where to save the FAISS store")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="pdf extraction processes")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks embedded per batch")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the manifest and re-embed everything")
+    parser.add_argument("--index-type", choices=INDEX_TYPES,
+                        help="index searched by app.py (default: the one the store has, else flat)")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW: neighbours per node")
+    parser.add_argument("--hnsw-ef-construction", type=int, help="HNSW: candidate list size while building")
+    parser.add_argument("--hnsw-ef-search", type=int, help="HNSW: candidate list size while searching")
+    parser.add_argument("--ivf-nlist", type=int, help="IVF-PQ: number of inverted lists")
+    parser.add_argument("--ivf-nprobe", type=int, help="IVF-PQ: lists visited per search")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ: sub-quantizers per vector")
+    parser.add_argument("--pq-nbits", type=int, help="IVF-PQ: bits per sub-quantizer code")
+    args = parser.parse_args()
+
+    settings = {"embedding_model": EMBEDDING_MODEL_NAME, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    stats = IngestStats()
+    embedding_model = get_embedding_model()
+    if args.rebuild:
+        db, manifest = None, Manifest(settings)
+    else:
+        db, manifest = load_existing(args.output, embedding_model, settings)
+
+    # Drop files that are gone, and skip files whose bytes did not change
+    pdf_files = list_pdf_files(args.data)
+    for source in set(manifest.files) - set(pdf_files):
+        for entry in manifest.files.pop(source)["pages"].values():
+            delete_chunks(db, entry["chunk_ids"], stats)
+    file_hashes = {path: sha256_file(path) for path in pdf_files}
+    changed_files = [path for path in pdf_files if not manifest.file_unchanged(path, file_hashes[path])]
+    print(f"Number of pdf files: {len(pdf_files)} ({len(changed_files)} new or changed)")
+
+    seen_pages = {}
+    pages = iter_changed_pages(iter_pages(changed_files, stats, workers=args.workers), manifest, db, stats, seen_pages)
+    chunks = iter_chunks(pages, get_text_splitter(), manifest)
+    db = build_vectorstore(iter_batches(chunks, args.batch_size), embedding_model, stats, db=db)
+
+    # Pages that no longer exist in a changed file
+    for source in changed_files:
+        pages_entry = manifest.pages(source)
+        for page in set(pages_entry) - seen_pages.get(source, set()):
+            delete_chunks(db, pages_entry.pop(page)["chunk_ids"], stats)
+        manifest.files[source]["sha256"] = file_hashes[source]
+
+    if db is None:
+        print("No text found in", args.data)
+        return
+
+    # Everything is written to a new build directory, which is published in one rename once
+    # complete: a worker starting meanwhile loads the previous build, not half of each
+    staged = stage_store(args.output)
+    save_vectorstore(db, staged)
+    # Without --index-type the store keeps its search index and parameters; flags override them
+    saved = search_index_config(store_path(args.output))
+    index_type = args.index_type or (saved["index_type"] if saved else "flat")
+    base = saved["params"] if saved and saved["index_type"] == index_type else None
+    params = index_params(index_type, base, m=args.hnsw_m, ef_construction=args.hnsw_ef_construction,
+                          ef_search=args.hnsw_ef_search, nlist=args.ivf_nlist, nprobe=args.ivf_nprobe,
+                          pq_m=args.pq_m, pq_nbits=args.pq_nbits)
+    save_search_index(db.index, staged, index_type, params)
+
+    # 6. lexical index over the same rows; cheap next to embedding, so rebuilt every run
+    docstore = MmapDocstore(os.path.join(staged, DOCSTORE_DIR))
+    build_bm25_index(os.path.join(staged, BM25_DIR), (docstore.search(row).page_content for row in range(len(docstore))))
+    manifest.save(staged)
+    publish_store(args.output, staged)
+    print(f"published {staged}")
+    embedding_model.cache.flush()
+    stats.report("done")
+    print(f"embedding cache: {embedding_model.cache.hits} hits, {embedding_model.cache.misses} misses")
+
 
+if __name__ == "__main__":
+    main()
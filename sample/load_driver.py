@@ -0,0 +1,118 @@
+import time
+import random
+import asyncio
+import argparse
+import aiohttp
+import numpy as np
+from load_test import QUESTIONS, client, register, login
+
+# Form posted to each route; {n} makes chat questions unique so they miss the answer cache
+ROUTES = {
+    "query": ("/query", lambda n: {"query": f"{QUESTIONS[n % len(QUESTIONS)]} (request {n})"}),
+    "query_stream": ("/query_stream", lambda n: {"query": f"{QUESTIONS[n % len(QUESTIONS)]} (request {n})"}),
+    "patient": ("/patient", lambda n: {"user_input": f"{QUESTIONS[n % len(QUESTIONS)]} (request {n})"}),
+    "predict": ("/predict", lambda n: {"glucose": 148, "bloodpressure": 72, "skinthickness": 35, "insulin": 0,
+                                       "bmi": 33.6, "dpf": 0.627, "age": 50}),
+    "heart_predict": ("/heart_predict", lambda n: {"age": 63, "sex": 1, "cp": 3, "trestbps": 145, "chol": 233,
+                                                   "fbs": 1, "restecg": 0, "thalach": 150, "exang": 0,
+                                                   "oldpeak": 2.3, "slope": 0, "ca": 0, "thal": 1}),
+    "alzheimer_predict": ("/alzheimer_predict", lambda n: {"age": 74, "education": 16, "mmse": 27,
+                                                           "gender": "Male", "ethnicity": "Not Hisp/Latino",
+                                                           "race": "White", "apoe_allele": "APOE4_0",
+                                                           "apoe_genotype": "3,3", "imputed_genotype": "True"}),
+}
+
+
+# Open-loop load driver: requests start at --rps on a fixed schedule, whatever the server's
+# latency, spread over the routes by --mix and over --sessions logged-in users per route.
+# A /query_stream request is timed until its last event has arrived.
+# Run it against the app backed by sample/mock_groq.py so no Groq quota is spent:
+#   python sample/mock_groq.py --latency-ms 400 &
+#   GROQ_API_BASE=http://127.0.0.1:9000 GROQ_API_KEY=mock uvicorn asgi:app --port 8000 &
+#   python sample/load_driver.py --rps 20 --duration 60
+# It prints throughput and p50/p95/p99 latency per route. A request counts as an error on a
+# non-200 status, a JSON "error", an "An error occurred" page, an event stream without a done
+# event, or a timeout.
+async def send(http, base_url, route, n, results):
+    path, form = ROUTES[route]
+    started = time.perf_counter()
+    try:
+        async with http.post(f"{base_url}{path}", data=form(n)) as response:
+            if response.content_type == "application/json":
+                ok = not (await response.json()).get("error")
+            elif response.content_type == "text/event-stream":
+                ok = "event: done" in await response.text()
+            else:
+                ok = "An error occurred" not in await response.text()
+            ok = ok and response.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        ok = False
+    results[route].append((ok, (time.perf_counter() - started) * 1000))
+
+async def drive(args, mix):
+    base_url = args.url.rstrip("/")
+    results = {route: [] for route in mix}
+    # Each route gets its own users, as a chat user and a patient-mode trainee are different people
+    sessions = {route: [client(args) for _ in range(args.sessions)] for route in mix}
+    everyone = [http for users in sessions.values() for http in users]
+    rng = random.Random(args.seed)
+    try:
+        await asyncio.gather(*(login(http, base_url, args) for http in everyone))
+        tasks, started = [], time.perf_counter()
+        for n in range(int(args.rps * args.duration)):
+            # Fixed arrival schedule: a slow server does not slow the offered load down
+            delay = started + n / args.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            route = rng.choices(list(mix), weights=list(mix.values()))[0]
+            tasks.append(asyncio.ensure_future(send(sessions[route][n % args.sessions], base_url, route, n, results)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*(http.close() for http in everyone))
+    return results, elapsed
+
+def summarize(samples, elapsed):
+    latencies = np.array([ms for ok, ms in samples if ok]) if any(ok for ok, _ in samples) else np.zeros(1)
+    ok = sum(ok for ok, _ in samples)
+    return {"requests": len(samples), "errors": len(samples) - ok, "rps": ok / elapsed,
+            "p50": float(np.percentile(latencies, 50)), "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99))}
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        route, _, weight = item.partition("=")
+        if route not in ROUTES:
+            raise SystemExit(f"unknown route {route!r}; choose from {', '.join(ROUTES)}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-route latency and throughput at a target request rate.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=10, help="offered requests per second, all routes together")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--mix", nargs="+", default=list(ROUTES),
+                        help="routes to exercise, optionally weighted, e.g. query=3 patient=1 predict")
+    parser.add_argument("--sessions", type=int, default=20, help="logged-in users per route")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--password", default="loadtest")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    asyncio.run(register(args))
+    results, elapsed = asyncio.run(drive(args, mix))
+    print(f"offered {args.rps:g} req/s for {args.duration:g}s, finished in {elapsed:.1f}s")
+    print(f"{'route':<18}{'requests':>10}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, samples in list(results.items()) + [("all", [s for samples in results.values() for s in samples])]:
+        result = summarize(samples, elapsed)
+        print(f"{route:<18}{result['requests']:>10}{result['errors']:>8}{result['rps']:>8.1f}"
+              f"{result['p50']:>9.0f}{result['p95']:>9.0f}{result['p99']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
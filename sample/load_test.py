@@ -0,0 +1,108 @@
+import time
+import asyncio
+import argparse
+import aiohttp
+import numpy as np
+
+QUESTIONS = [
+    "What is diabetes?",
+    "What are the symptoms of asthma?",
+    "How is hypertension treated?",
+    "What causes migraine headaches?",
+    "Which medicines are used for arthritis?",
+    "What is the treatment for pneumonia?",
+]
+ROUTES = {
+    "query": ("/query", "query"),
+    "query_stream": ("/query_stream", "query"),
+    "patient": ("/patient", "user_input"),
+}
+
+
+# Closed-loop load test: each virtual user logs in with its own cookie jar, then posts
+# questions back to back. Run it against one worker, e.g.
+#   gunicorn -w 1 app:app            (sync views, GUNICORN_THREADS threads)
+#   uvicorn asgi:app --workers 1      (async /query, /query_stream and /patient)
+# and compare the largest number of users each keeps within the p95 target. A streamed answer
+# is timed until its last event has arrived.
+def client(args):
+    # unsafe=True: keep the session cookie for IP hosts such as 127.0.0.1 too
+    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=args.timeout),
+                                 cookie_jar=aiohttp.CookieJar(unsafe=True))
+
+async def register(args):
+    async with client(args) as http:
+        await http.post(f"{args.url.rstrip('/')}/register",
+                        data={"name": "load test", "email": args.email, "password": args.password})
+
+async def login(http, base_url, args):
+    async with http.post(f"{base_url}/login", data={"email": args.email, "password": args.password}) as response:
+        response.raise_for_status()
+
+async def virtual_user(user, http, base_url, route, deadline, args, latencies, errors):
+    path, field = ROUTES[route]
+    i = user
+    while time.perf_counter() < deadline:
+        question = QUESTIONS[i % len(QUESTIONS)]
+        if not args.repeat_questions:
+            question = f"{question} (user {user}, request {i})"  # misses the answer cache
+        started = time.perf_counter()
+        try:
+            async with http.post(f"{base_url}{path}", data={field: question}) as response:
+                body = await response.json() if response.content_type == "application/json" else None
+                ok = response.status == 200 and not (body or {}).get("error")
+                if response.content_type == "text/event-stream":
+                    ok = ok and "event: done" in await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        (latencies if ok else errors).append((time.perf_counter() - started) * 1000)
+        i += 1
+
+async def run_level(users, args):
+    base_url = args.url.rstrip("/")
+    latencies, errors = [], []
+    sessions = [client(args) for _ in range(users)]
+    try:
+        # Log everyone in before the clock starts: password hashing is not what is measured
+        await asyncio.gather(*(login(http, base_url, args) for http in sessions))
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(virtual_user(user, http, base_url, args.route, deadline, args, latencies, errors)
+                               for user, http in enumerate(sessions)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*(http.close() for http in sessions))
+    values = np.array(latencies) if latencies else np.zeros(1)
+    return {"users": users, "requests": len(latencies), "errors": len(errors), "rps": len(latencies) / elapsed,
+            "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent users one server sustains on /query, /query_stream or /patient.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--route", choices=sorted(ROUTES), default="query")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50, 100, 200], help="concurrency levels")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--slo-ms", type=float, default=5000, help="p95 latency target")
+    parser.add_argument("--repeat-questions", action="store_true",
+                        help="reuse the sample questions, so most requests hit the answer cache")
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--password", default="loadtest")
+    args = parser.parse_args()
+
+    print(f"{'users':>6}{'requests':>10}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    asyncio.run(register(args))
+    sustained = 0
+    for users in args.users:
+        result = asyncio.run(run_level(users, args))
+        print(f"{result['users']:>6}{result['requests']:>10}{result['errors']:>8}{result['rps']:>8.1f}"
+              f"{result['p50']:>9.0f}{result['p95']:>9.0f}{result['p99']:>9.0f}")
+        if result["errors"] == 0 and result["requests"] and result["p95"] <= args.slo_ms:
+            sustained = users
+    print(f"concurrent users within p95 <= {args.slo_ms:.0f} ms and no errors: {sustained}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert
+
+# Ahead of sample/, whose app.py is an older copy of the app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app, db, resources, User, Conversation
+
+SESSION_ID = "history-bench-session"
+EMAIL = "history-bench@example.com"
+INSERT_BATCH = 2_000
+
+
+# Time to first byte, total time, size and peak Python memory (tracemalloc) of
+# /chat_history/<session_id> for one long session, served in-process by the Flask test
+# client from the app's own database. Run it on the commit before a change and after it:
+#   python sample/measure_chat_history.py --messages 10000
+# The seeded session is kept for the next run; --reseed rebuilds it.
+def seed(args):
+    user = User.query.filter_by(email=EMAIL).first()
+    if user is None:
+        user = User(name="History Bench", email=EMAIL, password="-")
+        db.session.add(user)
+        db.session.commit()
+    query = Conversation.query.filter_by(session_id=SESSION_ID, user_id=user.id)
+    if args.reseed or query.count() != args.messages:
+        query.delete()
+        start = datetime(2024, 1, 1)
+        filler = " ".join(["symptom"] * (args.message_chars // 8))
+        for offset in range(0, args.messages, INSERT_BATCH):
+            db.session.execute(insert(Conversation), [
+                {"session_id": SESSION_ID, "user_id": user.id, "person": "user" if i % 2 == 0 else "bot",
+                 "timestamp": start + timedelta(seconds=i), "message": f"message {i}: {filler}"}
+                for i in range(offset, min(offset + INSERT_BATCH, args.messages))])
+        db.session.commit()
+    return user.id
+
+def fetch(http, url, keep=False):
+    """(status, body or None, (ttfb ms, total ms, bytes, peak traced KiB)) of one GET, read as it streams."""
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    response = http.get(url, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks, b"")
+    ttfb = time.perf_counter() - started
+    body, size = [first], len(first)
+    for chunk in chunks:
+        size += len(chunk)
+        if keep:
+            body.append(chunk)
+    total = time.perf_counter() - started
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    return response.status_code, b"".join(body) if keep else None, (ttfb * 1000, total * 1000, size, peak / 1024)
+
+def report(name, samples):
+    samples = np.array(samples)
+    print(f"  {name:<30} ttfb p50 {np.percentile(samples[:, 0], 50):8.2f} ms   total p50 "
+          f"{np.percentile(samples[:, 1], 50):8.2f} ms   {int(samples[0, 2]):>10,} B   peak {samples[:, 3].max():9.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTFB and peak memory of the chat history page.")
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--message-chars", type=int, default=400)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--reseed", action="store_true", help="rebuild the seeded session")
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = seed(args)
+    # The models load in the background; let them finish so they do not show up in the peaks
+    resources.wait()
+
+    http = app.test_client()
+    with http.session_transaction() as session:
+        session["user_id"] = user_id
+    print(f"session of {args.messages:,} messages of ~{args.message_chars} characters")
+    tracemalloc.start()
+    page = []
+    for _ in range(args.repeats):
+        status, _, sample = fetch(http, f"/chat_history/{SESSION_ID}")
+        assert status == 200, status
+        page.append(sample)
+    report("page", page)
+
+    # Every older page, as scrolling back to the first message fetches them
+    url = f"/chat_history/{SESSION_ID}/messages"
+    if http.get(url).status_code == 404:
+        print("  (no older-messages endpoint on this tree)")
+        return
+    pages, started = [], time.perf_counter()
+    before = http.get(url).get_json()["before"]  # the first page is the one the page already shows
+    while before:
+        status, body, sample = fetch(http, f"{url}?before={before}", keep=True)
+        assert status == 200, status
+        pages.append(sample)
+        before = json.loads(body)["before"]
+    report(f"older pages ({len(pages)})", pages)
+    print(f"  all pages in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
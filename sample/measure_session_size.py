@@ -0,0 +1,60 @@
+import asyncio
+import argparse
+from yarl import URL
+from load_test import QUESTIONS, client, register, login
+
+COOKIE_LIMIT = 4096  # bytes browsers keep per cookie
+ROUTES = {
+    "query": ("/query", "query"),
+    "patient": ("/patient", "user_input"),
+}
+
+
+# Bytes of the Cookie header a client sends, and of the Set-Cookie headers and body it gets
+# back, turn by turn through one /query and one /patient conversation. Run it before and
+# after a change to the session against the same server setup, e.g. the app backed by
+# sample/mock_groq.py:
+#   python sample/measure_session_size.py --url http://127.0.0.1:8000 --turns 20
+def cookie_bytes(http, url):
+    return len("; ".join(f"{name}={morsel.value}" for name, morsel in http.cookie_jar.filter_cookies(URL(url)).items()))
+
+async def conversation(args, route):
+    base_url = args.url.rstrip("/")
+    path, field = ROUTES[route]
+    rows = []
+    async with client(args) as http:
+        await login(http, base_url, args)
+        for turn in range(1, args.turns + 1):
+            sent = cookie_bytes(http, f"{base_url}{path}")
+            question = f"{QUESTIONS[turn % len(QUESTIONS)]} (turn {turn})"
+            async with http.post(f"{base_url}{path}", data={field: question}) as response:
+                body = await response.read()
+                set_cookie = sum(len(value) for value in response.headers.getall("Set-Cookie", []))
+                rows.append((turn, response.status, sent, set_cookie, len(body)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cookie and response sizes over a conversation.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--route", choices=sorted(ROUTES), nargs="+", default=sorted(ROUTES))
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--password", default="loadtest")
+    args = parser.parse_args()
+
+    asyncio.run(register(args))
+    for route in args.route:
+        rows = asyncio.run(conversation(args, route))
+        print(f"\n/{route}")
+        print(f"{'turn':>5}{'status':>8}{'cookie sent':>13}{'set-cookie':>12}{'body':>9}")
+        for turn, status, sent, set_cookie, body in rows:
+            flag = "  over the browser cookie limit" if max(sent, set_cookie) > COOKIE_LIMIT else ""
+            print(f"{turn:>5}{status:>8}{sent:>13}{set_cookie:>12}{body:>9}{flag}")
+        print(f"total over {len(rows)} turns: cookie sent {sum(row[2] for row in rows)} B, "
+              f"set-cookie {sum(row[3] for row in rows)} B, body {sum(row[4] for row in rows)} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# USS (pages only this process maps) and PSS (shared pages split between their users) of each
+# gunicorn worker, with and without preload. Linux only: reads /proc/<pid>/smaps_rollup.
+def memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+def wait_ready(url, workers, timeout):
+    """Wait until /ready answers 200 several times in a row (requests land on random workers)."""
+    deadline = time.time() + timeout
+    streak = 0
+    while streak < 4 * workers:
+        if time.time() > deadline:
+            raise TimeoutError(f"{url} not ready after {timeout}s")
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                streak = streak + 1 if response.status == 200 else 0
+        except OSError:  # refused, timed out or a 503 (HTTPError) while workers boot
+            streak = 0
+            time.sleep(0.5)
+
+def measure(preload, args):
+    env = dict(os.environ, GUNICORN_PRELOAD="1" if preload else "0", WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_BIND=f"127.0.0.1:{args.port}")
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(f"http://127.0.0.1:{args.port}/ready", args.workers, args.timeout)
+        time.sleep(args.settle)
+        return memory_kb(server.pid), [memory_kb(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+
+def report(name, master, workers):
+    print(f"\n{name}")
+    print(f"  {'process':<10}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}")
+    for label, stats in [("master", master)] + [(f"worker {i}", w) for i, w in enumerate(workers)]:
+        print(f"  {label:<10}{stats['rss'] / 1024:>10.0f}{stats['pss'] / 1024:>10.0f}{stats['uss'] / 1024:>10.0f}")
+    total_pss = (master["pss"] + sum(w["pss"] for w in workers)) / 1024
+    print(f"  total PSS: {total_pss:.0f} MB  mean worker USS: {sum(w['uss'] for w in workers) / len(workers) / 1024:.0f} MB")
+    return total_pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker USS/PSS of gunicorn with and without preload.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for /ready")
+    parser.add_argument("--settle", type=float, default=5, help="seconds to wait after /ready before measuring")
+    args = parser.parse_args()
+
+    before = report("without preload (GUNICORN_PRELOAD=0)", *measure(False, args))
+    after = report("with preload (GUNICORN_PRELOAD=1)", *measure(True, args))
+    print(f"\ntotal PSS saved: {before - after:.0f} MB ({(before - after) / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
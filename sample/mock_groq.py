@@ -0,0 +1,129 @@
+import time
+import uuid
+import json
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+ANSWER = (
+    "Diabetes is a chronic condition in which the body cannot regulate blood sugar properly.\n"
+    "Common symptoms include increased thirst, frequent urination, fatigue and blurred vision.\n"
+    "Treatment combines diet, exercise, blood sugar monitoring and, when needed, medication such as insulin or metformin.\n"
+    "Please see a doctor for a diagnosis and a treatment plan suited to you.\n"
+)
+
+
+# Local stand-in for Groq's OpenAI-compatible chat API, for load tests that should not
+# spend Groq quota. Start it, then point the app at it:
+#   python sample/mock_groq.py --port 9000 --latency-ms 400 --tokens-per-second 250
+#   GROQ_API_BASE=http://127.0.0.1:9000 GROQ_API_KEY=mock gunicorn app:app
+# Every completion waits --latency-ms (+/- --jitter-ms) before its first token, then emits
+# --completion-tokens words at --tokens-per-second, streamed or not. A --error-rate share of
+# requests fails with --error-status instead. GET /stats reports what the server has seen.
+class MockGroq:
+    def __init__(self, args):
+        self.args = args
+        self.words = ANSWER.replace("\n", " \n").split(" ")
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def completion_pieces(self):
+        """The answer's words, repeated or cut to --completion-tokens, each counted as one token."""
+        count = self.args.completion_tokens
+        words = (self.words * (count // len(self.words) + 1))[:count]
+        return [word if i == 0 or word.startswith("\n") else " " + word for i, word in enumerate(words)]
+
+    def usage(self, messages, completion_tokens):
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def first_token_delay(self):
+        jitter = random.uniform(-self.args.jitter_ms, self.args.jitter_ms)
+        await asyncio.sleep(max(0.0, self.args.latency_ms + jitter) / 1000)
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        self.requests += 1
+        if random.random() < self.args.error_rate:
+            self.errors += 1
+            headers = {"retry-after": "1"} if self.args.error_status == 429 else {}
+            error = {"message": "injected error", "type": "mock_error", "code": str(self.args.error_status)}
+            return web.json_response({"error": error}, status=self.args.error_status, headers=headers)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self.first_token_delay()
+            if body.get("stream"):
+                self.streamed += 1
+                return await self.stream(request, body)
+            pieces = self.completion_pieces()
+            await asyncio.sleep(len(pieces) / self.args.tokens_per_second)
+            return web.json_response({
+                "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)},
+                             "logprobs": None, "finish_reason": "stop"}],
+                "usage": self.usage(body.get("messages", []), len(pieces)),
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def stream(self, request, body):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        chunk_id, created, model = f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), body.get("model", "mock")
+
+        async def send(delta, finish_reason=None, **extra):
+            chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+                     **extra}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        pieces = self.completion_pieces()
+        await send({"role": "assistant", "content": ""})
+        for piece in pieces:
+            await send({"content": piece})
+            await asyncio.sleep(1 / self.args.tokens_per_second)
+        await send({}, "stop", x_groq={"usage": self.usage(body.get("messages", []), len(pieces))})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def models(self, request):
+        return web.json_response({"object": "list", "data": [{"id": "mixtral-8x7b-32768", "object": "model"}]})
+
+    async def stats(self, request):
+        return web.json_response({"requests": self.requests, "streamed": self.streamed, "errors": self.errors,
+                                  "in_flight": self.in_flight, "max_in_flight": self.max_in_flight})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Groq (OpenAI-compatible) chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=300, help="delay before the first token")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="uniform +/- jitter on --latency-ms")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail, 0..1")
+    parser.add_argument("--error-status", type=int, default=500, help="status of injected errors, e.g. 429 or 503")
+    args = parser.parse_args()
+
+    mock = MockGroq(args)
+    app = web.Application()
+    # The groq client posts to <base_url>/openai/v1/...; plain OpenAI clients use <base_url>/v1/...
+    for prefix in ("/openai/v1", "/v1"):
+        app.router.add_post(f"{prefix}/chat/completions", mock.chat_completions)
+        app.router.add_get(f"{prefix}/models", mock.models)
+    app.router.add_get("/stats", mock.stats)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Single-flight coalescing of identical concurrent QA chain calls.
+
+When the same question arrives several times while its answer is still
+being computed, only the first request (the leader) runs retrieval and
+the Groq call; the others wait for its result, or its exception. Keys are
+the normalized question plus the prompt version, so a prompt change never
+shares an answer computed with the old prompt. Finished keys are removed
+at once; repeats after that are the answer cache's job.
+
+do() serves the threaded Flask views and ado() the async ones in asgi.py.
+Both use concurrent.futures.Future, so waiters may be on either side.
+
+stream() and astream() do the same for a streamed answer: the leader's
+items go into a Broadcast, which replays them to the other requests from
+the first item on and then follows the stream as it grows. The stream is
+only cut short when every request reading it has gone away.
+"""
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from embedding_cache import normalize_text
+
+
+def prompt_version(template):
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+class Broadcast:
+    """The items of one stream, readable from the start by any number of threads and event loops."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.readers = 0  # requests reading it besides a sync leader
+        self.cancel = None  # stops the producer of an async stream
+        self._changed = threading.Condition()
+        self._events = []  # (loop, asyncio.Event) of async readers waiting for an item
+
+    def _notify(self):
+        self._changed.notify_all()
+        for loop, event in self._events:
+            loop.call_soon_threadsafe(event.set)
+        self._events = []
+
+    def push(self, item):
+        with self._changed:
+            self.items.append(item)
+            self._notify()
+
+    def close(self, error=None):
+        with self._changed:
+            self.done, self.error = True, error
+            self._notify()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self._changed:
+                while position == len(self.items) and not self.done:
+                    self._changed.wait()
+                items, done, error = self.items[position:], self.done, self.error
+            yield from items
+            position += len(items)
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+    async def __aiter__(self):
+        position = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            event = asyncio.Event()
+            with self._changed:
+                items, done, error = self.items[position:], self.done, self.error
+                if not items and not done:
+                    self._events.append((loop, event))
+            for item in items:
+                yield item
+            position += len(items)
+            if done:
+                if error is not None:
+                    raise error
+                return
+            if not items:
+                await event.wait()
+
+
+class SingleFlight:
+    def __init__(self, version=""):
+        self.version = version
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> Future
+        self._streams = {}  # key -> Broadcast
+
+    def key(self, query):
+        return f"{self.version}:{normalize_text(query)}"
+
+    def _join(self, key):
+        """Return (future, is_leader)."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            self.upstream_calls += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._in_flight[key]
+            self.errors += error is not None
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _join_stream(self, key, make):
+        """Return (broadcast, is_leader); make() creates the broadcast of a new stream."""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self.coalesced += 1
+                broadcast.readers += 1
+                return broadcast, False
+            broadcast = self._streams[key] = make()
+            self.upstream_calls += 1
+            return broadcast, True
+
+    def _abandon(self, key, broadcast):
+        """Forget the stream if no other request reads it; returns whether it was forgotten."""
+        with self._lock:
+            if broadcast.readers or broadcast.done:
+                return False
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            return True
+
+    def _leave(self, key, broadcast):
+        with self._lock:
+            broadcast.readers -= 1
+        if broadcast.cancel is not None and self._abandon(key, broadcast):
+            broadcast.cancel()
+
+    def _end_stream(self, key, broadcast, error=None):
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            self.errors += isinstance(error, Exception)
+        broadcast.close(error)
+
+    def do(self, query, fn):
+        """Return fn(), or the result of the identical call already in flight."""
+        key = self.key(query)
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, query, coroutine_fn):
+        """Async do(): await coroutine_fn(), or the identical call already in flight."""
+        key = self.key(query)
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coroutine_fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stream(self, query, fn):
+        """Yield the items of fn(), or of the identical stream already in flight."""
+        key = self.key(query)
+        broadcast, leader = self._join_stream(key, Broadcast)
+        if not leader:
+            try:
+                yield from broadcast
+            finally:
+                self._leave(key, broadcast)
+            return
+        items, error = iter(fn()), None
+        try:
+            for item in items:
+                broadcast.push(item)
+                yield item
+        except GeneratorExit:
+            # The leader's client went away: the requests sharing the stream still get all of it
+            if not self._abandon(key, broadcast):
+                try:
+                    for item in items:
+                        broadcast.push(item)
+                except Exception as e:
+                    error = e
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._end_stream(key, broadcast, error)
+
+    async def _produce(self, key, broadcast, agen_fn):
+        items, error = agen_fn(), None
+        try:
+            async for item in items:
+                broadcast.push(item)
+        except BaseException as e:
+            error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            await items.aclose()
+            self._end_stream(key, broadcast, error)
+
+    async def astream(self, query, agen_fn):
+        """Async stream(): the items of agen_fn(), produced in a task that runs while anyone reads them."""
+        key = self.key(query)
+        loop = asyncio.get_running_loop()
+        def make():
+            made = Broadcast()
+            made.readers = 1  # the leader reads it like the others
+            task = loop.create_task(self._produce(key, made, agen_fn))
+            made.cancel = lambda: loop.call_soon_threadsafe(task.cancel)
+            return made
+        broadcast, _ = self._join_stream(key, make)
+        try:
+            async for item in broadcast:
+                yield item
+        finally:
+            self._leave(key, broadcast)
+
+    def stats(self):
+        with self._lock:
+            requests = self.upstream_calls + self.coalesced
+            return {"upstream_calls": self.upstream_calls, "coalesced": self.coalesced,
+                    "saved_ratio": self.coalesced / requests if requests else 0.0,
+                    "in_flight": len(self._in_flight) + len(self._streams), "errors": self.errors, "prompt_version": self.version}
@@ -0,0 +1,133 @@
+"""Fast path for greetings, thanks and goodbyes in chat mode.
+
+CUSTOM_PROMPT_TEMPLATE tells the LLM how to answer "hello", but getting
+there costs a query embedding, a FAISS search and a Groq completion.
+SmallTalkClassifier answers such messages from RESPONSES instead:
+
+1. Rules: the whole message, lowercased and without punctuation, matches
+   an intent's pattern, e.g. "Hi doctor!" or "thanks a lot". No model is
+   involved; this takes microseconds.
+2. Centroids: short messages the rules miss are embedded (the query LRU
+   keeps the vector for the retriever) and compared with the mean
+   embedding of each intent's EXAMPLES and of MEDICAL_EXAMPLES. It is
+   small talk if an intent's centroid is nearest, at least
+   SMALL_TALK_THRESHOLD similar, and SMALL_TALK_MARGIN ahead of the
+   medical one. Without fit() only the rules apply.
+
+Anything else, including "hi, I have a headache", goes to the QA chain.
+stats() counts the messages checked and the LLM calls avoided.
+"""
+import os
+import re
+import random
+import threading
+from collections import Counter
+import numpy as np
+from embedding_cache import normalize_text
+
+SMALL_TALK_THRESHOLD = float(os.environ.get("SMALL_TALK_THRESHOLD", "0.7"))
+SMALL_TALK_MARGIN = float(os.environ.get("SMALL_TALK_MARGIN", "0.1"))
+SMALL_TALK_MAX_WORDS = 8  # longer messages are questions; they skip the centroid check
+
+ADDRESS = r"(?: (?:doctor|doc|dr|sir|madam|meditrain(?: ai)?))?"
+INTENT_PATTERNS = {
+    "greeting": r"(?:hi+|hello+|hey+|hiya|yo|greetings|namaste|good (?:morning|afternoon|evening|day))(?: there| all)?",
+    "thanks": r"(?:(?:ok(?:ay)?|great|perfect|cool) )?(?:thanks?|thank you|thank u|thx|ty|many thanks|much appreciated)"
+              r"(?: (?:so|very) much| a lot| again)?",
+    "goodbye": r"(?:(?:ok(?:ay)? )?(?:bye+|bye bye|goodbye|good night|see you(?: later| soon)?|take care|have a nice day))",
+}
+RULES = {intent: re.compile(f"{pattern}{ADDRESS}") for intent, pattern in INTENT_PATTERNS.items()}
+
+EXAMPLES = {
+    "greeting": ["hello", "hi doctor", "hey there", "good morning", "hi, how are you?", "hello, anyone there?",
+                 "greetings doctor", "hey, nice to meet you"],
+    "thanks": ["thank you", "thanks a lot doctor", "that was helpful, thanks", "thank you so much for your help",
+               "appreciate it", "great, thanks for explaining"],
+    "goodbye": ["bye", "goodbye doctor", "see you later", "that's all, bye", "have a good day", "take care, bye"],
+}
+MEDICAL_EXAMPLES = ["what is diabetes?", "I have a headache and fever", "symptoms of asthma",
+                    "how is hypertension treated?", "hello, my chest hurts", "what medicine helps with pain?",
+                    "is this rash serious?", "side effects of metformin", "my child has a cough",
+                    "thanks, but what about the dosage?"]
+RESPONSES = {
+    "greeting": ["Hello! I'm Meditrain AI. How can I help you with your health questions today?",
+                 "Hi there! I'm here to help with any medical concerns. What would you like to know?"],
+    "thanks": ["You're welcome! Let me know if you have any other health questions.",
+               "Glad I could help. Feel free to ask if anything else comes up."],
+    "goodbye": ["Goodbye, and take care! Come back any time you have a health question.",
+                "Take care! If your symptoms change or get worse, please see a doctor."],
+}
+
+
+def rule_text(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize_text(text)).split())
+
+def unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class SmallTalkClassifier:
+    def __init__(self, threshold=SMALL_TALK_THRESHOLD, margin=SMALL_TALK_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self.labels = None
+        self.centroids = None  # unit vectors, one row per label; the last row is "medical"
+        self.checked = 0
+        self.diverted = Counter()
+        self.methods = Counter()
+        self._lock = threading.Lock()
+
+    def fit(self, embeddings):
+        """Compute the centroids with the query embedding model; returns self."""
+        groups = list(EXAMPLES.values()) + [MEDICAL_EXAMPLES]
+        vectors = unit(embeddings.embed_documents([text for group in groups for text in group]))
+        bounds = np.cumsum([0] + [len(group) for group in groups])
+        self.centroids = unit([vectors[start:end].mean(axis=0) for start, end in zip(bounds, bounds[1:])])
+        self.labels = list(EXAMPLES) + ["medical"]
+        return self
+
+    def rule_intent(self, query):
+        text = rule_text(query)
+        return next((intent for intent, rule in RULES.items() if rule.fullmatch(text)), None)
+
+    def centroid_intent(self, query_vector):
+        scores = self.centroids @ unit(query_vector)
+        best = int(np.argmax(scores[:-1]))
+        if scores[best] >= self.threshold and scores[best] - scores[-1] >= self.margin:
+            return self.labels[best]
+        return None
+
+    def classify(self, query, embed=None):
+        """Return (intent, method), or (None, None) for a message the QA chain should answer.
+
+        embed() returns the query embedding; it is only called when the rules miss.
+        """
+        intent = self.rule_intent(query)
+        if intent is not None:
+            return intent, "rule"
+        if self.centroids is not None and embed is not None and len(query.split()) <= SMALL_TALK_MAX_WORDS:
+            intent = self.centroid_intent(embed())
+            if intent is not None:
+                return intent, "centroid"
+        return None, None
+
+    def respond(self, query, embed=None):
+        """A QA-chain-shaped response for small talk, or None."""
+        intent, method = self.classify(query, embed)
+        with self._lock:
+            self.checked += 1
+            if intent is not None:
+                self.diverted[intent] += 1
+                self.methods[method] += 1
+        if intent is None:
+            return None
+        return {"query": query, "result": random.choice(RESPONSES[intent]), "source_documents": []}
+
+    def stats(self):
+        with self._lock:
+            diverted = sum(self.diverted.values())
+            return {"checked": self.checked, "diverted": diverted,
+                    "diverted_ratio": diverted / self.checked if self.checked else 0.0,
+                    "by_intent": dict(self.diverted), "by_method": dict(self.methods),
+                    "centroids": self.centroids is not None}
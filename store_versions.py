@@ -0,0 +1,56 @@
+"""Versioned layout of the vector store directory.
+
+Every build of the store (index.faiss, search_index.*, docstore/, bm25/,
+manifest.json) is written into a fresh directory under db_path, then
+published at once by renaming a new CURRENT file over the old one::
+
+    vectorstore/db_faiss/
+        CURRENT                 name of the published build
+        20250601-101500-4242/   index.faiss, docstore/, bm25/, ...
+        20250530-090000-1234/   the build before it
+
+A reader resolves CURRENT once (store_path) and opens every file from that
+directory, so it never mixes two builds, however many are published while
+it loads. Stores written before versions (files directly in db_path, no
+CURRENT) are read in place.
+
+Publishing removes the builds before the previous one. A process that has
+one of them memory-mapped keeps reading it: the files stay until unmapped.
+"""
+import os
+import re
+import time
+import shutil
+
+CURRENT_FILE = "CURRENT"
+VERSION_RE = re.compile(r"^\d{8}-\d{6}-\d+$")
+
+
+def store_path(db_path):
+    """Directory of the published build of the store at db_path."""
+    try:
+        with open(os.path.join(db_path, CURRENT_FILE), encoding="utf-8") as f:
+            return os.path.join(db_path, f.read().strip())
+    except FileNotFoundError:
+        return db_path
+
+
+def stage_store(db_path):
+    """Create an empty directory for a new build of the store at db_path."""
+    path = os.path.join(db_path, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    os.makedirs(path)
+    return path
+
+
+def publish_store(db_path, staged):
+    """Make the build in staged (from stage_store) the published one."""
+    previous = store_path(db_path)
+    current = os.path.join(db_path, CURRENT_FILE)
+    with open(current + ".tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(staged))
+    os.replace(current + ".tmp", current)
+    # Older builds, and what failed runs left staged
+    keep = {os.path.basename(staged), os.path.basename(previous)}
+    for name in os.listdir(db_path):
+        if VERSION_RE.match(name) and name not in keep:
+            shutil.rmtree(os.path.join(db_path, name), ignore_errors=True)
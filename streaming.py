@@ -0,0 +1,72 @@
+"""Server-sent events helpers for /query_stream.
+
+The stream is a sequence of SSE events, each with a JSON payload:
+
+    sources  metadata of the retrieved chunks, sent before the LLM is called
+    token    {"text"}: a piece of the completion as Groq returns it
+    line     {"text", "bg_color"}: a completed, cleaned line of the answer
+    done     {"cached", "small_talk", "ttft_ms", "total_ms"}
+    error    {"error"}
+
+StreamStats keeps the time-to-first-token and total duration of recent
+streams for /metrics.
+"""
+import json
+import threading
+from collections import deque
+import numpy as np
+
+LATENCY_SAMPLES = 1000  # recent streams kept for percentiles
+
+
+def sse(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class LineBuffer:
+    """Completed lines of a text that arrives in chunks."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk):
+        """The lines chunk completes."""
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split("\n")
+        return lines
+
+    def flush(self):
+        """The unterminated last line, if any."""
+        line, self.buffer = self.buffer, ""
+        return [line] if line else []
+
+
+def _percentiles(values):
+    values = np.array(values) if values else np.zeros(1)
+    return {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95))}
+
+
+class StreamStats:
+    def __init__(self, max_samples=LATENCY_SAMPLES):
+        self.streams = 0
+        self.cached = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._ttft = deque(maxlen=max_samples)
+        self._total = deque(maxlen=max_samples)
+
+    def record(self, ttft_ms, total_ms, cached=False, error=False):
+        with self._lock:
+            self.streams += 1
+            self.cached += cached
+            self.errors += error
+            if ttft_ms is not None:
+                self._ttft.append(ttft_ms)
+            self._total.append(total_ms)
+
+    def stats(self):
+        with self._lock:
+            return {"streams": self.streams, "cached": self.cached, "errors": self.errors,
+                    "ttft_ms": _percentiles(self._ttft), "total_ms": _percentiles(self._total)}
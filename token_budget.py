@@ -0,0 +1,136 @@
+"""Token budget for the prompts sent to Groq, in chat and simulated-patient mode.
+
+Every prompt gets PROMPT_TOKEN_BUDGET tokens. The system prompt and the
+current question are always kept; what is left goes to the variable
+section, trimmed lowest-value first:
+
+    chat     retrieved chunks: the lowest ranked are dropped first and the
+             last one kept is cut to fit (ContextBudgetCompressor)
+    patient  conversation history: the oldest messages are dropped first
+
+Tokens are counted locally with a tokenizers (Rust) tokenizer.json when
+TOKENIZER_FILE exists, otherwise estimated from word lengths. Fetch one
+once with:
+
+    python token_budget.py download
+
+Each request logs the tokens it used per section.
+"""
+import os
+import re
+import sys
+import logging
+import threading
+from typing import Any, Optional, Sequence
+from langchain_core.documents import Document, BaseDocumentCompressor
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_FILE = os.environ.get("TOKENIZER_FILE", "vectorstore/tokenizer/tokenizer.json")
+# Llama-2 SentencePiece tokenizer: not gated, and within a few percent of Mixtral's token counts
+TOKENIZER_REPO = "hf-internal-testing/llama-tokenizer"
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "4096"))
+MIN_CHUNK_TOKENS = 32  # a chunk that would be cut shorter than this is dropped instead
+PIECE_RE = re.compile(r"\w+|[^\w\s]")
+CHARS_PER_TOKEN = 4  # estimate used without a tokenizer file
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """The tokenizers.Tokenizer for TOKENIZER_FILE, or None to use the estimate."""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                if os.path.exists(TOKENIZER_FILE):
+                    from tokenizers import Tokenizer
+                    _tokenizer = Tokenizer.from_file(TOKENIZER_FILE)
+                else:
+                    logger.info("%s not found, estimating token counts", TOKENIZER_FILE)
+                    _tokenizer = False
+    return _tokenizer or None
+
+def token_ends(text):
+    """End offset in text of each of its tokens."""
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return [end for _, end in tokenizer.encode(text, add_special_tokens=False).offsets]
+    # Estimate: one token per CHARS_PER_TOKEN characters of each word, one per punctuation mark
+    ends = []
+    for match in PIECE_RE.finditer(text):
+        start, end = match.span()
+        ends.extend(range(min(start + CHARS_PER_TOKEN, end), end, CHARS_PER_TOKEN))
+        ends.append(end)
+    return ends
+
+def count_tokens(text):
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return len(token_ends(text))
+
+def truncate_tokens(text, max_tokens):
+    ends = token_ends(text)
+    if len(ends) <= max_tokens:
+        return text
+    return text[:ends[max_tokens - 1]] if max_tokens > 0 else ""
+
+
+def fit_chunks(texts, budget):
+    """Keep texts in rank order while they fit in budget; cut the first one that does not, drop the rest."""
+    kept, used = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if used + tokens <= budget:
+            kept.append(text)
+            used += tokens
+            continue
+        if budget - used >= MIN_CHUNK_TOKENS:
+            kept.append(truncate_tokens(text, budget - used))
+            used = budget
+        break
+    return kept, used
+
+def fit_history(messages, budget, content=lambda message: message["content"]):
+    """Keep the most recent messages that fit in budget (dropping the oldest first)."""
+    used = 0
+    for start in range(len(messages) - 1, -1, -1):
+        tokens = count_tokens(content(messages[start]))
+        if used + tokens > budget:
+            return messages[start + 1:], used
+        used += tokens
+    return messages, used
+
+def log_usage(mode, sections, budget, kept, total):
+    used = sum(sections.values())
+    logger.info("prompt tokens [%s] %s total=%d/%d (%d/%d %s kept)", mode,
+                " ".join(f"{name}={tokens}" for name, tokens in sections.items()), used, budget,
+                kept, total, "chunks" if mode == "chat" else "messages")
+    if used > budget:
+        logger.warning("prompt [%s] is over its token budget: %d > %d", mode, used, budget)
+
+
+class ContextBudgetCompressor(BaseDocumentCompressor):
+    """Trims the retrieved chunks so template + question + context fit in budget tokens."""
+    template: str
+    budget: int = PROMPT_TOKEN_BUDGET
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Any] = None):
+        system = count_tokens(self.template.format(context="", question=""))
+        question = count_tokens(query)
+        texts, context = fit_chunks([doc.page_content for doc in documents], self.budget - system - question)
+        log_usage("chat", {"system": system, "question": question, "context": context}, self.budget,
+                  len(texts), len(documents))
+        return [Document(id=doc.id, page_content=text, metadata=doc.metadata) for doc, text in zip(documents, texts)]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["download"]:
+        sys.exit("usage: python token_budget.py download [repo_id]")
+    from huggingface_hub import hf_hub_download
+    import shutil
+    os.makedirs(os.path.dirname(TOKENIZER_FILE) or ".", exist_ok=True)
+    shutil.copy(hf_hub_download(sys.argv[2] if len(sys.argv) > 2 else TOKENIZER_REPO, "tokenizer.json"), TOKENIZER_FILE)
+    print("Wrote", TOKENIZER_FILE)
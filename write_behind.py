@@ -0,0 +1,198 @@
+"""Write-behind queue for rows that do not have to be stored before the response.
+
+put() queues rows and returns at once. A writer thread hands them to
+flush_fn in batches, as soon as WRITE_BEHIND_BATCH_ROWS are waiting or
+WRITE_BEHIND_INTERVAL_MS after the oldest one arrived. At most
+WRITE_BEHIND_MAX_PENDING rows are held: beyond that put() waits up to
+WRITE_BEHIND_PUT_TIMEOUT for the writer, then drops its rows with an
+error, so memory and request latency stay bounded when the database is
+down. A failed batch is kept and retried with backoff, in order. A
+batch failing with one of rejects (errors about the rows themselves,
+e.g. a value too long for its column) is split in halves instead, down
+to the offending row, which is logged and dropped.
+
+Rows are tagged with keys (e.g. a chat session). wait_for(key) flushes
+early and returns once everything queued under the key is written, so a
+reader sees its own writes. close() writes what is left; it runs at
+interpreter exit and from the gunicorn/uvicorn shutdown hooks.
+WRITE_BEHIND=0 makes put() write synchronously.
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from process_thread import ProcessThread
+
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "1") != "0"
+WRITE_BEHIND_INTERVAL_MS = float(os.environ.get("WRITE_BEHIND_INTERVAL_MS", "200"))
+WRITE_BEHIND_BATCH_ROWS = int(os.environ.get("WRITE_BEHIND_BATCH_ROWS", "500"))
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_PUT_TIMEOUT = float(os.environ.get("WRITE_BEHIND_PUT_TIMEOUT", "5"))
+RETRY_MAX_SECONDS = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    def __init__(self, flush_fn, context=None, rejects=(), enabled=WRITE_BEHIND,
+                 interval_ms=WRITE_BEHIND_INTERVAL_MS, batch_rows=WRITE_BEHIND_BATCH_ROWS,
+                 max_pending=WRITE_BEHIND_MAX_PENDING, put_timeout=WRITE_BEHIND_PUT_TIMEOUT):
+        self.flush_fn = flush_fn
+        self.context = context  # e.g. app.app_context, entered around each flush
+        self.rejects = tuple(rejects)  # exception types that retrying the same rows cannot fix
+        self.enabled = enabled
+        self.interval = interval_ms / 1000
+        self.batch_rows = batch_rows
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.rows_written = 0
+        self.batches = 0
+        self.failures = 0
+        self.rows_rejected = 0
+        self.rows_dropped = 0
+        self.producer_waits = 0
+        self.last_flush_ms = 0.0
+        self._reset()
+        self._writer = ProcessThread(self._run, "write-behind", on_start=self._reset)
+        atexit.register(self.close)
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._pending = deque()    # (seq, enqueued_at, row)
+        self._last_seq = {}        # key -> seq of its newest row
+        self._seq = 0              # seq of the newest row queued
+        self._written = 0          # seq of the newest row written; rows are written in seq order
+        self._flush_now = False
+        self._closed = False
+        self._limit = self.batch_rows  # lowered while splitting a rejected batch
+        self._split_until = 0          # seq of the last row of the rejected batch
+
+    def _flush(self, rows):
+        with self.context() if self.context is not None else nullcontext():
+            self.flush_fn(rows)
+
+    def put(self, rows, keys=()):
+        """Queue rows for writing; keys name what wait_for() can wait on."""
+        if not self.enabled or self._closed:
+            self._flush(rows)
+            return
+        self._writer.ensure()
+        with self._cond:
+            if len(self._pending) + len(rows) > self.max_pending:
+                self.producer_waits += 1
+                if not self._cond.wait_for(lambda: len(self._pending) + len(rows) <= self.max_pending
+                                           or self._closed, self.put_timeout):
+                    self.rows_dropped += len(rows)
+                    logger.error("write-behind queue full for %.1fs, dropped %d rows", self.put_timeout, len(rows))
+                    return
+            # An idle writer waits without a timeout; wake it to start the interval
+            if not self._pending or len(self._pending) + len(rows) >= self.batch_rows:
+                self._cond.notify_all()
+            now = time.monotonic()
+            for row in rows:
+                self._seq += 1
+                self._pending.append((self._seq, now, row))
+            for key in keys:
+                self._last_seq[key] = self._seq
+
+    def _next_batch(self):
+        """Wait until a batch is due; None once closed with nothing left."""
+        with self._cond:
+            while True:
+                if self._pending:
+                    due = self._pending[0][1] + self.interval
+                    if self._flush_now or self._closed or len(self._pending) >= self.batch_rows \
+                            or time.monotonic() >= due:
+                        break
+                    self._cond.wait(due - time.monotonic())
+                elif self._closed:
+                    return None
+                else:
+                    self._flush_now = False
+                    self._cond.wait()
+            count = min(len(self._pending), self._limit)
+            return [self._pending[i] for i in range(count)]
+
+    def _run(self):
+        delay = 0.1
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                self._flush([row for _, _, row in batch])
+            except self.rejects:
+                with self._cond:
+                    self.failures += 1
+                    if len(batch) > 1:
+                        # Split until the rejected row is alone; the rows around it are written
+                        self._limit = len(batch) // 2
+                        self._split_until = max(self._split_until, batch[-1][0])
+                        continue
+                logger.exception("write-behind dropped a row the database rejects: %r", batch[0][2])
+                self._done(batch, started, rejected=True)
+                continue
+            except Exception:
+                # Kept at the head of the queue and retried; later rows wait behind it
+                logger.exception("write-behind flush of %d rows failed, retrying in %.1fs", len(batch), delay)
+                with self._cond:
+                    self.failures += 1
+                    self._cond.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+                continue
+            delay = 0.1
+            self._done(batch, started)
+
+    def _done(self, batch, started, rejected=False):
+        """Take a written (or rejected) batch off the queue."""
+        with self._cond:
+            for _ in batch:
+                self._pending.popleft()
+            self._written = batch[-1][0]
+            self._last_seq = {key: seq for key, seq in self._last_seq.items() if seq > self._written}
+            self._flush_now = self._flush_now and bool(self._pending)
+            if self._written >= self._split_until:
+                self._limit = self.batch_rows
+            if rejected:
+                self.rows_rejected += len(batch)
+            else:
+                self.rows_written += len(batch)
+                self.batches += 1
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self._cond.notify_all()
+
+    def wait_for(self, key, timeout=5.0):
+        """Flush now and wait until the rows queued under key are written; False on timeout."""
+        with self._cond:
+            target = self._last_seq.get(key)
+            if target is None or target <= self._written:
+                return True
+            self._flush_now = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout=30.0):
+        """Write everything queued, then stop the writer; later puts write synchronously."""
+        if not self._writer.started():
+            return True
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            target = self._seq
+            done = self._cond.wait_for(lambda: self._written >= target, timeout)
+        if not done:
+            logger.error("write-behind queue closed with %d rows unwritten", len(self._pending))
+        return done
+
+    def stats(self):
+        with self._cond:
+            return {"enabled": self.enabled, "pending": len(self._pending), "max_pending": self.max_pending,
+                    "rows_written": self.rows_written, "batches": self.batches,
+                    "rows_per_batch": self.rows_written / self.batches if self.batches else 0.0,
+                    "last_flush_ms": self.last_flush_ms, "failures": self.failures,
+                    "rows_rejected": self.rows_rejected, "rows_dropped": self.rows_dropped,
+                    "producer_waits": self.producer_waits}